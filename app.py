@@ -1,40 +1,97 @@
 # API Endpoint for Tauri application
 # Using FastAPI to handle OCR requests
 import os
+import sys
+import signal
+import hmac
+import multiprocessing
+import time
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware # Import the middleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 # Utilities
 from io import BytesIO
+from contextlib import asynccontextmanager
 import PIL.Image as Image
 import tempfile
 from pydantic import BaseModel, Field
 from typing import Annotated, List
 # Core modules
 from core.utils import read_config, resource_path
-from core.cert_architecture import CertificateArchitecture, OCRModelType, NERModelType
+from core.cpu_budget import CPUBudget
+from core import model_manager
+
+# Thread budget and offline model paths must be in the environment before the model libraries are imported
+config = read_config()
+CPU_BUDGET = CPUBudget.from_config(config, workers=int(config.get("WORKERS", "1")))
+CPU_BUDGET.apply_environment()
+MODEL_COMMANDS = ("prefetch", "verify")
+# Model commands run before any model library is imported: paddlex and docTR read their
+# cache directories at import time, so prefetch must set them first
+if __name__ == "__main__" and sys.argv[1:2] and sys.argv[1] in MODEL_COMMANDS:
+    multiprocessing.freeze_support()
+    model_manager.main(sys.argv[1:])
+    sys.exit(0)
+model_manager.apply_local_environment()
+
+from core.results import dumps
+from core.dedup import PerceptualHashIndex, EXACT, TEMPLATE
+from core.memory import MemoryTracker, WorkerRecycler
+from core.store import ResultStore
+from core.stub import StubArchitecture
 # Gemini API
 from google import genai
 from google.genai import types
 
 # Load configuration
-config = read_config()
+MODEL_BACKEND           = config.get("MODEL_BACKEND", "local").lower()
+STUB_LATENCY_MS         = int(config.get("STUB_LATENCY_MS", "500"))
 OCR_MODEL               = config.get("OCR_MODEL", "paddle").lower()
 NER_MODEL               = config.get("NER_MODEL", "LLM").lower()
 HAS_LLM_POSTPROCESSING  = config.get("HAS_LLM_POSTPROCESSING", "True").lower() == "true"
 HAS_IMAGE_PREPROCESSING = config.get("HAS_IMAGE_PREPROCESSING", "True").lower() == "true"
+HAS_REGION_SELECTION    = config.get("HAS_REGION_SELECTION", "False").lower() == "true"
+LLM_OCR_VARIANT         = config.get("LLM_OCR_VARIANT", "large").lower()
+LLM_OCR_PROFILE         = config.get("LLM_OCR_PROFILE", "accuracy").lower()
+LLM_OCR_THREADS         = int(config.get("LLM_OCR_THREADS", "0")) or None
+LLM_MODE                = config.get("LLM_MODE", "separate").lower()
+LLM_SPECULATIVE         = config.get("LLM_SPECULATIVE", "off").lower()
+LLM_DRAFT_TOKENS        = int(config.get("LLM_DRAFT_TOKENS", "10"))
+LLM_KIE_TEMPERATURE     = float(config.get("LLM_KIE_TEMPERATURE", "0.1"))
+LLM_POST_INPUT_TOKENS   = int(config.get("LLM_POST_INPUT_TOKENS", "0")) or None
+LLM_KIE_INPUT_TOKENS    = int(config.get("LLM_KIE_INPUT_TOKENS", "0")) or None
+HAS_DEDUP_INDEX         = config.get("HAS_DEDUP_INDEX", "False").lower() == "true"
+DEDUP_MAX_ENTRIES       = int(config.get("DEDUP_MAX_ENTRIES", "10000"))
+DEDUP_MAX_DISTANCE      = int(config.get("DEDUP_MAX_DISTANCE", "10"))
+HAS_RESULT_STORE        = config.get("HAS_RESULT_STORE", "False").lower() == "true"
+RESULTS_DB              = config.get("RESULTS_DB", "results.db")
+RESULTS_IMAGE_DIR       = config.get("RESULTS_IMAGE_DIR", "stored_images")
+STORE_BATCH_SIZE        = int(config.get("STORE_BATCH_SIZE", "100"))
+STORE_FLUSH_MS          = int(config.get("STORE_FLUSH_MS", "200"))
 
 WORKERS                 = int(config.get("WORKERS", "1"))
+MAX_REQUESTS_PER_WORKER = int(config.get("MAX_REQUESTS_PER_WORKER", "0"))
+MAX_WORKER_RSS_MB       = int(config.get("MAX_WORKER_RSS_MB", "0"))
+MEMORY_TRACEMALLOC      = config.get("MEMORY_TRACEMALLOC", "False").lower() == "true"
+ADMIN_TOKEN             = config.get("ADMIN_TOKEN", "")
 HOST                    = config.get("HOST", "127.0.0.1")
 PORT                    = int(config.get("PORT", "8000"))
 
 GEMINI_API_KEY          = config.get("GEMINI_API", "")
 GEMINI_MODEL            = config.get("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_BASE_URL         = config.get("GEMINI_BASE_URL", "")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Write the queued results before the worker exits
+    if RESULT_STORE is not None:
+        RESULT_STORE.close()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 origins = [
     "http://localhost",
     "http://localhost:3000"
@@ -47,6 +104,35 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 cert_architecture = None
+MEMORY_TRACKER = MemoryTracker(trace=MEMORY_TRACEMALLOC)
+RECYCLER = WorkerRecycler(MAX_REQUESTS_PER_WORKER, MAX_WORKER_RSS_MB)
+
+# Only model requests count toward MAX_REQUESTS_PER_WORKER (not pages, static files or stats)
+PROCESSING_PATHS = {"/process_ocr", "/process_ocr_bulk", "/process_gemini"}
+
+@app.middleware("http")
+async def recycle_worker(request: Request, call_next):
+    """Shuts the worker down gracefully once it reaches its request or memory limit."""
+    response = await call_next(request)
+    if request.url.path not in PROCESSING_PATHS:
+        return response
+    reason = RECYCLER.after_request()
+    if reason:
+        print(f"[ SERVER ] Recycling worker {os.getpid()}: {reason}")
+        # uvicorn finishes the requests in progress, the supervisor then starts a new worker
+        signal.raise_signal(signal.SIGTERM)
+    return response
+
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    """
+    Reports the time spent handling the request in a Server-Timing header. Clients can
+    subtract it from their latency to get the time the request waited before being handled.
+    """
+    start = time.perf_counter()
+    response = await call_next(request)
+    response.headers["Server-Timing"] = f"app;dur={(time.perf_counter() - start) * 1000:.1f}"
+    return response
 
 STATIC_DIR = resource_path("static")
 TEMPLATES_DIR = resource_path("templates")
@@ -57,14 +143,34 @@ app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 def load_model_once():
     """Simulates loading a large model that takes time."""
     global cert_architecture
+    if cert_architecture is None and MODEL_BACKEND == "stub":
+        print(f"[ SERVER ] Using the stub model backend ({STUB_LATENCY_MS} ms per certificate)")
+        cert_architecture = StubArchitecture(STUB_LATENCY_MS)
     if cert_architecture is None:
+        # Imported here so that the stub backend never loads the model libraries
+        from core.cert_architecture import CertificateArchitecture, OCRModelType, NERModelType, LLMMode
+        ocr_types = {model_type.value: model_type for model_type in OCRModelType}
+        ner_types = {model_type.value: model_type for model_type in NERModelType}
         print("[ SERVER ] Loading heavy model... (This runs only once)")
         cert_architecture = CertificateArchitecture(
-            ocr_type=OCRModelType.DOCTR if OCR_MODEL == "doctr" else OCRModelType.PADDLE,
-            ner_type=NERModelType.LLM if NER_MODEL == "llm" else NERModelType.SPACY,
+            ocr_type=ocr_types.get(OCR_MODEL, OCRModelType.PADDLE),
+            ner_type=ner_types.get(NER_MODEL, NERModelType.SPACY),
             with_image_preprocessor=HAS_IMAGE_PREPROCESSING,
-            with_llm_postprocessor=HAS_LLM_POSTPROCESSING
+            with_llm_postprocessor=HAS_LLM_POSTPROCESSING,
+            llm_ocr_variant=LLM_OCR_VARIANT,
+            llm_ocr_profile=LLM_OCR_PROFILE,
+            llm_ocr_threads=LLM_OCR_THREADS,
+            cpu_budget=CPU_BUDGET,
+            llm_mode=LLMMode(LLM_MODE),
+            speculative=LLM_SPECULATIVE,
+            draft_tokens=LLM_DRAFT_TOKENS,
+            kie_temperature=LLM_KIE_TEMPERATURE,
+            post_input_tokens=LLM_POST_INPUT_TOKENS,
+            kie_input_tokens=LLM_KIE_INPUT_TOKENS,
+            with_region_selection=HAS_REGION_SELECTION,
+            memory_tracker=MEMORY_TRACKER
         )
+        MEMORY_TRACKER.mark_baseline()
         print("[ SERVER ] Model Loaded!")
     return cert_architecture
     
@@ -73,6 +179,63 @@ def load_model_once():
 async def serve_home(request: Request):
     return templates.TemplateResponse("index.html", {"request": request, "title": "My FastAPI App"})
 
+# Near-duplicate index: re-scans and certificates of the same template skip the models
+DEDUP_INDEX = PerceptualHashIndex(DEDUP_MAX_ENTRIES, DEDUP_MAX_DISTANCE) if HAS_DEDUP_INDEX else None
+
+# Extracted certificates are kept in SQLite and can be searched with /certificates
+RESULT_STORE = ResultStore(RESULTS_DB, RESULTS_IMAGE_DIR, STORE_BATCH_SIZE, STORE_FLUSH_MS / 1000) if HAS_RESULT_STORE else None
+
+def store_local_result(result, image_bytes, filename):
+    """
+    Queues a local pipeline result for the result store and returns it pointing at the kept
+    image copy (the temporary upload is overwritten by the next request).
+    """
+    if RESULT_STORE is None:
+        return result
+    sha, image_path = RESULT_STORE.save_image(image_bytes, filename)
+    result = result.copy(image_path)
+    fields = result.to_legacy_dict()
+    # Names may contain ", " ("Ayin M. Tamondong, M.Sc."), so the joined string is not split again
+    fields["SIGNATORIES"] = [span.text for span in result.candidates("SIGNATORIES")]
+    RESULT_STORE.add("local", fields, filename, sha, image_path, result)
+    return result
+
+def store_gemini_result(fields, image_bytes, filename):
+    """Queues a Gemini extraction for the result store."""
+    if RESULT_STORE is None:
+        return
+    sha, image_path = RESULT_STORE.save_image(image_bytes, filename)
+    RESULT_STORE.add("gemini", fields, filename, sha, image_path)
+
+def save_upload(image, filename):
+    """Saves a decoded upload to a temporary path in the computer and returns the path."""
+    temp_path = tempfile.gettempdir()
+    image_path = os.path.join(temp_path, filename)
+    image.save(image_path)
+    return image_path
+
+def run_local_model(model, image_bytes, filename):
+    """Runs the local pipeline on an uploaded image, using the duplicate index when enabled."""
+    image = Image.open(BytesIO(image_bytes))
+    image_path = save_upload(image, filename)
+    if DEDUP_INDEX is None:
+        return model.predict_result(image_path)
+
+    kind, digest, phash, cached = DEDUP_INDEX.lookup(image)
+    result = None
+    if kind == EXACT:
+        print("[ SERVER ] Exact duplicate, returning the cached result.")
+        result = cached.copy(image_path)
+    elif kind == TEMPLATE:
+        result = model.predict_from_template(image_path, cached)
+        if result is None:
+            DEDUP_INDEX.record_fallback()
+    if result is None:
+        result = model.predict_result(image_path)
+    DEDUP_INDEX.add(digest, phash, result)
+    print(f"[ SERVER ] Duplicate index: {DEDUP_INDEX.report()}")
+    return result
+
 @app.post("/process_ocr")
 async def process_ocr(
     image_file: UploadFile = File(...)
@@ -80,28 +243,104 @@ async def process_ocr(
     model = load_model_once() 
     try:
         image_bytes = await image_file.read()
-        image = Image.open(BytesIO(image_bytes))
-        # Save image to a temporary path in the computer then send the path to the model
-        temp_path = tempfile.gettempdir()
-        image_path = os.path.join(temp_path, image_file.filename)
-        image.save(image_path)
-        extracted_data = model.predict(image_path)
+        result = run_local_model(model, image_bytes, image_file.filename)
+        result = store_local_result(result, image_bytes, image_file.filename)
         return {
             "status": "success",
             "file_name": image_file.filename,
             "file_size_bytes": len(image_bytes),
-            "extracted_text": extracted_data
+            "extracted_text": result.to_legacy_dict(),
+            # Every candidate with confidence, character offsets and 0-1000 boxes
+            "entities": result.to_compact()
         }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Processing failed: {e}")
 
+@app.post("/process_ocr_bulk")
+async def process_ocr_bulk(
+    files: List[UploadFile] = File(...)
+):
+    """Runs the local model on several images and returns the compact column-oriented results."""
+    model = load_model_once()
+    try:
+        results = []
+        for image_file in files:
+            image_bytes = await image_file.read()
+            result = run_local_model(model, image_bytes, image_file.filename)
+            result = store_local_result(result, image_bytes, image_file.filename)
+            results.append({"file_name": image_file.filename, **result.to_compact()})
+        # Serialized directly (orjson when installed) instead of going through FastAPI's encoder
+        return Response(content=dumps({"status": "success", "results": results}), media_type="application/json")
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Processing failed: {e}")
+
+@app.get("/admin/memory")
+async def admin_memory(request: Request):
+    """RSS, resident size of every model and (with MEMORY_TRACEMALLOC) allocation growth of this worker."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")   # Disabled unless ADMIN_TOKEN is set
+    token = request.headers.get("X-Admin-Token") or ""
+    if not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):   # Constant-time comparison
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+    return {
+        **MEMORY_TRACKER.snapshot(),
+        "requests_served": RECYCLER.requests,
+        "max_requests": MAX_REQUESTS_PER_WORKER,
+        "max_rss_mb": MAX_WORKER_RSS_MB,
+    }
+
+@app.get("/dedup_stats")
+async def dedup_stats():
+    """Hit rates of the near-duplicate index."""
+    if DEDUP_INDEX is None:
+        return {"enabled": False}
+    return {"enabled": True, **DEDUP_INDEX.report()}
+
+@app.get("/cascade_stats")
+async def cascade_stats():
+    """Average LLM calls, output tokens and latency per certificate of the cascade extractor."""
+    if MODEL_BACKEND == "stub" or NER_MODEL != "cascade" or cert_architecture is None:
+        return {"enabled": False}
+    return {"enabled": True, **cert_architecture.ner_predictor.report()}
+
+@app.get("/certificates")
+async def list_certificates(
+    awardee: str | None = None,
+    event: str | None = None,
+    date: str | None = None,
+    signatory: str | None = None,
+    q: str | None = None,
+    limit: int = 50,
+    cursor: int | None = None
+):
+    """
+    Stored certificates, newest first. awardee/event/date/signatory match whole values
+    (case-insensitive), q searches every field. Pass next_cursor back to get the next page.
+    """
+    if RESULT_STORE is None:
+        raise HTTPException(status_code=503, detail="The result store is disabled (HAS_RESULT_STORE).")
+    return RESULT_STORE.search(awardee, event, date, signatory, q, limit, cursor)
+
+@app.get("/certificates/{certificate_id}")
+async def get_certificate(certificate_id: int):
+    """A stored certificate with every extracted candidate."""
+    if RESULT_STORE is None:
+        raise HTTPException(status_code=503, detail="The result store is disabled (HAS_RESULT_STORE).")
+    record = RESULT_STORE.get(certificate_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Certificate not found.")
+    return record
+
 # GEMINI API
 GEMINI_CLIENT = None
 if GEMINI_API_KEY:
     try:
         # Client is initialized using the GEMINI_API_KEY environment variable
-        GEMINI_CLIENT = genai.Client(api_key=GEMINI_API_KEY)
+        # GEMINI_BASE_URL points the client at another endpoint (e.g. the mock of tools/load_test.py)
+        http_options = types.HttpOptions(base_url=GEMINI_BASE_URL) if GEMINI_BASE_URL else None
+        GEMINI_CLIENT = genai.Client(api_key=GEMINI_API_KEY, http_options=http_options)
     except Exception as e:
         print(f"[ SERVER ] No GEMINI API Key found or error initializing Gemini Client: {e}")
     
@@ -176,6 +415,7 @@ async def extract_info(
             document_info_instance = DocumentInfo.model_validate_json(response.text)
             document_info_dict = document_info_instance.model_dump()
             print(f"[ SERVER ] Extracted Document Info: {document_info_dict}")
+            store_gemini_result(document_info_dict, image_bytes, file.filename)
         except Exception as e:
             print(f"[ SERVER ] Error parsing Gemini response: {e}")
             raise HTTPException(
@@ -194,15 +434,53 @@ async def extract_info(
         )
 
 def main():
+    # Fail fast if the configured models are not available locally
+    problems = model_manager.verify(config) if MODEL_BACKEND != "stub" else []
+    if problems:
+        model_manager.report(problems)
+        sys.exit(1)
     print("[ SERVER ] Starting FastAPI server...")
     print("[ SERVER ] Model Configuration:")
+    print(f" - Model Backend: {MODEL_BACKEND}")
     print(f" - OCR Model: {OCR_MODEL}")
+    if OCR_MODEL == "llm":
+        print(f" - LLM OCR: Florence-2 {LLM_OCR_VARIANT} ({LLM_OCR_PROFILE} profile)")
     print(f" - NER Model: {NER_MODEL}")
     print(f" - LLM Post-Processing: {HAS_LLM_POSTPROCESSING}")
+    print(f" - LLM Mode: {LLM_MODE}")
+    print(f" - KIE Speculative Decoding: {LLM_SPECULATIVE}")
+    if LLM_SPECULATIVE != "off" and LLM_KIE_TEMPERATURE > 0:
+        print(f"   (temperature {LLM_KIE_TEMPERATURE}: outputs may differ from non-speculative runs, set LLM_KIE_TEMPERATURE = 0 for identical outputs)")
     print(f" - Image Pre-Processing: {HAS_IMAGE_PREPROCESSING}")
+    print(f" - Region Selection: {HAS_REGION_SELECTION}")
     print(f" - Gemini Client Initialized: {GEMINI_CLIENT is not None}")
     print(f" - Workers: {WORKERS}")
-    uvicorn.run(app, host=HOST, port=PORT, workers=WORKERS, log_level="debug")
+    if RECYCLER.enabled:
+        print(f" - Worker Recycling: after {MAX_REQUESTS_PER_WORKER or '-'} requests or {MAX_WORKER_RSS_MB or '-'} MB RSS")
+    CPU_BUDGET.report()
+    if RECYCLER.enabled and getattr(sys, "frozen", False):
+        # Workers are re-imported as "app:app", which the PyInstaller build cannot do
+        print("[ SERVER ] Worker recycling is not available in the packaged application, "
+              "MAX_REQUESTS_PER_WORKER and MAX_WORKER_RSS_MB are ignored.")
+        RECYCLER.max_requests = RECYCLER.max_rss_mb = 0
+        uvicorn.run(app, host=HOST, port=PORT, workers=WORKERS, log_level="debug")
+    elif RECYCLER.enabled:
+        run_supervised()
+    else:
+        uvicorn.run(app, host=HOST, port=PORT, workers=WORKERS, log_level="debug")
+
+def run_supervised():
+    """
+    Runs the workers under uvicorn's process supervisor, which replaces a worker that
+    exits after recycling. The listening socket stays open in the supervisor, so
+    connections arriving during a restart wait in the backlog instead of being refused.
+    """
+    from uvicorn.supervisors import Multiprocess
+    server_config = uvicorn.Config("app:app", host=HOST, port=PORT, workers=WORKERS, log_level="debug")
+    server = uvicorn.Server(server_config)
+    sock = server_config.bind_socket()
+    Multiprocess(server_config, target=server.run, sockets=[sock]).run()
     
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
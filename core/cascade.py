@@ -0,0 +1,76 @@
+from core.spacy_predict import NERPredictor
+from core.llm_kie import LLMKIEPredictor
+from core.results import CATEGORIES, spans_from_prediction
+import time
+
+MULTI_VALUED = {"SIGNATORIES"}     # Every other category holds a single value
+
+class CascadeExtractor:
+    """
+    Runs spaCy first and asks the KIE model only for the fields spaCy could not settle:
+    - missing: no entity of that category was found
+    - ambiguous: a single-valued category received several different candidates
+    The confident spaCy fields are passed to the LLM as context (e.g. so that the awardee
+    is not listed as a signatory). Certificates fully covered by spaCy skip the LLM.
+    """
+    def __init__(self, ner: NERPredictor, kie: LLMKIEPredictor):
+        self.ner = ner
+        self.kie = kie
+        self.llm = kie.llm
+        self.stats = {"certificates": 0, "llm_calls": 0, "fields_requested": 0,
+                      "completion_tokens": 0, "llm_seconds": 0.0, "seconds": 0.0}
+
+    def unresolved_fields(self, spans, fields=CATEGORIES):
+        """Categories spaCy missed or found several different values for."""
+        unresolved = []
+        for category in fields:
+            values = {text.strip().lower() for label, text, _, _ in spans if label == category}
+            if not values or (category not in MULTI_VALUED and len(values) > 1):
+                unresolved.append(category)
+        return unresolved
+
+    def predict_spans(self, text, fields=None):
+        """
+        Returns (label, text, start_char, end_char) for every entity (only fields are checked
+        and completed). Only whole-certificate calls (fields=None) are counted in the stats,
+        so a template match that falls back to the full pipeline is not counted twice.
+        """
+        start = time.perf_counter()
+        whole_certificate = fields is None
+        spans = self.ner.predict_spans(text)
+        fields = self.unresolved_fields(spans, fields or CATEGORIES)
+        llm_fields = llm_tokens = llm_seconds = 0
+        if fields:
+            context = {}
+            for label, value, _, _ in spans:
+                if label not in fields:
+                    context.setdefault(label, []).append(value)
+            print(f"[ MODEL ] Cascade: spaCy left {', '.join(fields)} unresolved, running KIE...")
+            prediction = self.kie.predict(text, fields=fields, context=context)
+            llm_fields, llm_tokens, llm_seconds = len(fields), self.kie.last_completion_tokens, self.kie.last_seconds
+            # Keep spaCy's candidates for any field the LLM could not fill either
+            filled = {label for label in fields if prediction.get(label)}
+            spans = [span for span in spans if span[0] not in filled]
+            spans += spans_from_prediction(text, prediction, [label for label in fields if label in filled])
+        else:
+            print("[ MODEL ] Cascade: spaCy resolved every field, KIE skipped")
+        if whole_certificate:
+            self.stats["certificates"] += 1
+            self.stats["llm_calls"] += 1 if llm_fields else 0
+            self.stats["fields_requested"] += llm_fields
+            self.stats["completion_tokens"] += llm_tokens
+            self.stats["llm_seconds"] += llm_seconds
+            self.stats["seconds"] += time.perf_counter() - start
+        return spans
+
+    def report(self):
+        """Average LLM usage per certificate."""
+        certificates = self.stats["certificates"] or 1
+        return {
+            "certificates": self.stats["certificates"],
+            "llm_call_rate": round(self.stats["llm_calls"] / certificates, 4),
+            "avg_fields_requested": round(self.stats["fields_requested"] / certificates, 2),
+            "avg_completion_tokens": round(self.stats["completion_tokens"] / certificates, 1),
+            "avg_llm_seconds": round(self.stats["llm_seconds"] / certificates, 3),
+            "avg_seconds": round(self.stats["seconds"] / certificates, 3),
+        }
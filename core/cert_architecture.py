@@ -6,8 +6,19 @@ from core.spacy_predict import NERPredictor      # NER predictor
 from core.llm_kie import LLMKIEPredictor         # LLM KIE predictor
 from core.llm_ocr import LLMOCRWrapper           # LLM OCR wrapper
 from core.text_correction import regex_pipeline  # Import the regex cleaning function
+from core.cpu_budget import CPUBudget            # Thread allocation per stage
+from core.llm_engine import make_draft_model     # Speculative decoding for KIE
+from core.results import CertificateResult, CATEGORIES, locate, normalize_tokens, spans_from_prediction  # Structured results
+from core.regions import RegionSelector, to_page_boxes  # Text region selection before OCR
+from core.memory import MemoryTracker            # Resident memory per model
+from core.cascade import CascadeExtractor        # spaCy first, KIE for the fields it missed
 # Libraries
+from difflib import SequenceMatcher
 from enum import Enum
+from PIL import Image
+import gc
+import os
+import tempfile
 
 class OCRModelType(Enum):   # Enum for OCR model selection
     DOCTR = "doctr"
@@ -17,43 +28,131 @@ class OCRModelType(Enum):   # Enum for OCR model selection
 class NERModelType(Enum):
     SPACY = "spacy"
     LLM = "llm"
+    CASCADE = "cascade"     # spaCy, then the LLM only for missing or ambiguous fields
+
+# Fields printed on the certificate template, shared by every awardee of the same batch
+TEMPLATE_FIELDS = ["EVENT", "DATE", "LOCATION", "SIGNATORIES"]
+# Fields that may differ per awardee (participant vs speaker), read again on template matches
+AWARDEE_FIELDS = ["AWARDEE", "ROLE", "TYPE"]
+TEMPLATE_MIN_SIMILARITY = 0.8   # Cached vs re-read text of a template field
+
+class LLMMode(Enum):        # How post-processing and KIE use llama.cpp when both are enabled
+    SEPARATE = "separate"   # Qwen2.5-3B for post-processing, Qwen2.5-7B for KIE
+    SHARED = "shared"       # One Qwen2.5-7B engine serves both prompts
+    FUSED = "fused"         # One Qwen2.5-7B engine, clean-up and extraction in a single prompt
 
-CATEGORIES = ["TYPE", "AWARDEE", "ROLE", "EVENT", "DATE", "LOCATION", "SIGNATORIES"]
 class CertificateArchitecture:
-    ocr_model: DoctrOCRWrapper | PaddleOCRWrapper
+    ocr_model: DoctrOCRWrapper | PaddleOCRWrapper | LLMOCRWrapper
     llm_postprocessor: LLMPostProcessor
     image_preprocessor: ImagePreProcessor
-    ner_predictor: NERPredictor
+    ner_predictor: NERPredictor | LLMKIEPredictor | CascadeExtractor
     def __init__(
         self,
         ocr_type=OCRModelType.PADDLE,
         ner_type=NERModelType.SPACY,
         with_llm_postprocessor=True,
-        with_image_preprocessor=True,            
+        with_image_preprocessor=True,
+        llm_ocr_variant="large",
+        llm_ocr_profile="accuracy",
+        llm_ocr_threads=None,
+        cpu_budget: CPUBudget | None = None,
+        llm_mode=LLMMode.SEPARATE,
+        speculative="off",
+        draft_tokens=10,
+        kie_temperature=0.1,
+        post_input_tokens=None,
+        kie_input_tokens=None,
+        with_region_selection=False,
+        memory_tracker: MemoryTracker | None = None,
     ):
         """Initializes the CertificateArchitecture with specified OCR model, LLM post-processor, and NER predictor."""
         self.ocr_type = ocr_type
         self.with_llm_postprocessor = with_llm_postprocessor
         self.with_image_preprocessor = with_image_preprocessor
-        match(ocr_type):
-            case OCRModelType.DOCTR:
-                self.ocr_model = DoctrOCRWrapper()
-            case OCRModelType.PADDLE:
-                self.ocr_model = PaddleOCRWrapper()
-            case OCRModelType.LLM:
-                self.ocr_model = LLMOCRWrapper()
+        self.with_region_selection = with_region_selection
+        self.llm_ocr_variant = llm_ocr_variant
+        self.llm_ocr_profile = llm_ocr_profile
+        self.cpu_budget = cpu_budget or CPUBudget()
+        self.llm_ocr_threads = llm_ocr_threads or self.cpu_budget.ocr_threads
+        self.cpu_budget.apply_runtime()
+        self.memory = memory_tracker or MemoryTracker()
+        with self.memory.measure(f"OCR ({ocr_type.value})"):
+            self.ocr_model = self.load_ocr_model(ocr_type)
+        # Shared/fused modes only apply when both LLM stages are enabled
+        if not (ner_type in (NERModelType.LLM, NERModelType.CASCADE) and with_llm_postprocessor):
+            llm_mode = LLMMode.SEPARATE
+        # spaCy reads the cleaned text in the cascade, so the clean-up cannot be fused into KIE
+        if ner_type == NERModelType.CASCADE and llm_mode == LLMMode.FUSED:
+            llm_mode = LLMMode.SHARED
+        self.llm_mode = llm_mode
+        # The separate post-processor is loaded first so its Qwen2.5-3B can draft for the KIE model
+        if llm_mode == LLMMode.SEPARATE and with_llm_postprocessor:
+            with self.memory.measure("LLM post-processor"):
+                self.llm_postprocessor = LLMPostProcessor(
+                    n_threads=self.cpu_budget.llm_threads,
+                    max_input_tokens=post_input_tokens
+                )
         match(ner_type):
             case NERModelType.SPACY:
-                self.ner_predictor = NERPredictor()
+                with self.memory.measure("NER (spacy)"):
+                    self.ner_predictor = NERPredictor()
             case NERModelType.LLM:
-                self.ner_predictor = LLMKIEPredictor()
-        if with_llm_postprocessor:
-            self.llm_postprocessor = LLMPostProcessor()
+                with self.memory.measure("NER (llm)"):
+                    self.ner_predictor = self.load_kie_predictor(speculative, draft_tokens, kie_input_tokens, kie_temperature)
+            case NERModelType.CASCADE:
+                with self.memory.measure("NER (spacy)"):
+                    ner = NERPredictor()
+                with self.memory.measure("NER (llm)"):
+                    kie = self.load_kie_predictor(speculative, draft_tokens, kie_input_tokens, kie_temperature)
+                self.ner_predictor = CascadeExtractor(ner, kie)
+        match(llm_mode):
+            case LLMMode.SHARED:
+                self.llm_postprocessor = LLMPostProcessor(
+                    llm=self.ner_predictor.llm,
+                    max_input_tokens=post_input_tokens
+                )
+            case LLMMode.FUSED:
+                # The KIE prompt does the clean-up, no post-processing pass is needed
+                self.with_llm_postprocessor = False
         if with_image_preprocessor:
             self.image_preprocessor = ImagePreProcessor()
+        if with_region_selection:
+            self.region_selector = RegionSelector()
         pass
 
+    def load_kie_predictor(self, speculative, draft_tokens, kie_input_tokens, temperature=0.1):
+        """Builds the Qwen2.5-7B KIE predictor, drafting with the post-processor's model when it is loaded."""
+        separate_post = self.llm_mode == LLMMode.SEPARATE and self.with_llm_postprocessor
+        return LLMKIEPredictor(
+            n_threads=self.cpu_budget.llm_threads,
+            fused=self.llm_mode == LLMMode.FUSED,
+            draft_model=make_draft_model(
+                speculative, num_pred_tokens=draft_tokens,
+                draft_llm=self.llm_postprocessor.llm if separate_post else None
+            ),
+            max_input_tokens=kie_input_tokens,
+            temperature=temperature
+        )
+
+    def load_ocr_model(self, ocr_type: OCRModelType):
+        """Builds the OCR wrapper for the given model type."""
+        match(ocr_type):
+            case OCRModelType.DOCTR:
+                return DoctrOCRWrapper()
+            case OCRModelType.PADDLE:
+                return PaddleOCRWrapper(cpu_threads=self.cpu_budget.ocr_threads)
+            case OCRModelType.LLM:
+                return LLMOCRWrapper(
+                    variant=self.llm_ocr_variant,
+                    profile=self.llm_ocr_profile,
+                    num_threads=self.llm_ocr_threads,
+                )
+
     def predict(self, image_path):
+        """Runs the full prediction pipeline and returns the flat result of /process_ocr"""
+        return self.predict_result(image_path).to_legacy_dict()
+
+    def predict_result(self, image_path) -> CertificateResult:
         """Runs the full prediction pipeline"""
         # Image preprocessing
         if self.with_image_preprocessor:
@@ -62,12 +161,21 @@ class CertificateArchitecture:
         else:
             preprocessed_image = image_path
         
-        # OCR text extraction
+        # Text region selection: drop borders, seals and logos, crop to the text lines
+        upright = False
+        ocr_image = preprocessed_image
+        if self.with_region_selection:
+            ocr_image, upright, crop_box, page_size = self.region_selector.select(preprocessed_image)
+
+        # OCR text extraction (with word boxes on a 0-1000 scale and confidences)
         print("[ MODEL ] Running OCR model...")
-        if self.ocr_type == OCRModelType.PADDLE:
-            ocr_output = self.ocr_model.predict(preprocessed_image)
-        elif self.ocr_type == OCRModelType.DOCTR:
-            ocr_output, _, _ = self.ocr_model.predict(preprocessed_image)
+        try:
+            ocr_output, words, boxes, scores = self.run_ocr(ocr_image, upright)
+        finally:
+            if ocr_image != preprocessed_image:
+                os.remove(ocr_image)    # Temporary crop of the region selector
+        if self.with_region_selection:
+            boxes = to_page_boxes(boxes, crop_box, page_size)
         
         print("[ MODEL ] OCR Output:", ocr_output)
 
@@ -85,25 +193,131 @@ class CertificateArchitecture:
 
         # Entity extraction
         print("[ MODEL ] Running inference model...")
-        prediction = self.ner_predictor.predict(cleaned_text)
-        print("[ MODEL ] Prediction Output:", prediction)
-        # Compile final results
-        results = {}
-        for category in CATEGORIES:
-            results[category] = ", ".join(prediction.get(category, [])) if category == 'SIGNATORIES' and isinstance(prediction.get(category, []), list) else (prediction.get(category, [""])[0] if len(prediction.get(category, [])) > 0 else "")
+        spans = self.extract_spans(cleaned_text)
+        print("[ MODEL ] Prediction Output:", spans)
+
+        # Compile final results, tracing every candidate back to its OCR words
+        result = CertificateResult(cleaned_text, image_path)
+        for label, text, start, end in spans:
+            box, confidence = locate(text, words, boxes, scores)
+            result.add(label, text, confidence, start, end, box)
 
         # Return results
         print(f"[ MODEL ] Final result:")
-        print(results)
-        results['IMAGE_PATH'] = image_path
+        print(result.to_legacy_dict())
         
-        return results
+        return result
+
+    def run_ocr(self, image_path, upright=False):
+        """Runs the OCR model. On upright pages PaddleOCR skips its text line orientation classifier."""
+        ocr_threads = self.llm_ocr_threads if self.ocr_type == OCRModelType.LLM else self.cpu_budget.ocr_threads
+        self.cpu_budget.set_torch_threads(ocr_threads)
+        if self.ocr_type == OCRModelType.PADDLE:
+            return self.ocr_model.predict_words(image_path, upright=upright)
+        return self.ocr_model.predict_words(image_path)
+
+    def predict_from_template(self, image_path, template: CertificateResult):
+        """
+        Builds the result of a near-duplicate certificate from a cached one. The cached
+        template fields are first checked by reading their boxes on the new page; the
+        awardee is then read from the band of the cached awardee and extracted with the
+        configured extractor. Per-awardee fields (TYPE, ROLE) are only kept when found in
+        that band. Returns None (full pipeline) when a check fails or no awardee is found.
+        """
+        awardee_boxes = [span.box for span in template.candidates("AWARDEE") if span.box is not None]
+        if not awardee_boxes:
+            return None
+        image = Image.open(image_path)
+        if not self.template_matches(image, template):
+            print("[ MODEL ] Template fields differ on this page, running the full pipeline...")
+            return None
+
+        _, y1, _, y2 = awardee_boxes[0]
+        # Names differ in length: keep the full page width and a margin above/below the old name
+        margin = max(10, (y2 - y1) // 2)
+        top, bottom = max(0, y1 - margin), min(1000, y2 + margin)
+
+        print("[ MODEL ] Template match, reading the awardee region only...")
+        band_text, band_words, band_boxes, band_scores = self.read_region(image, (0, top, 1000, bottom))
+        if not band_text or not band_boxes:
+            return None
+        if self.with_llm_postprocessor:
+            band_text = self.llm_postprocessor.predict(band_text)
+        band_text = regex_pipeline(band_text)
+        spans = self.extract_spans(band_text, fields=AWARDEE_FIELDS)
+        if not any(label == "AWARDEE" for label, _, _, _ in spans):
+            return None
+
+        # Offsets refer to the text of the cached certificate, so they are not carried over
+        result = CertificateResult("", image_path)
+        for index in range(len(template)):
+            span = template.span(index)
+            if span.label in TEMPLATE_FIELDS:
+                result.add(span.label, span.text, span.confidence, box=span.box)
+        band_height = bottom - top
+        for label, text, _, _ in spans:
+            box, confidence = locate(text, band_words, band_boxes, band_scores)
+            if box is not None:
+                box = (box[0], top + box[1] * band_height // 1000, box[2], top + box[3] * band_height // 1000)
+            result.add(label, text, confidence, box=box)
+        print(f"[ MODEL ] Final result:")
+        print(result.to_legacy_dict())
+        return result
+
+    def template_matches(self, image, template: CertificateResult):
+        """
+        Reads the boxes of the cached template fields on the new page and compares them
+        with the cached text. Every field with a box must match; fields without a box
+        cannot be checked, so at least one checked field is required.
+        """
+        checked = 0
+        for index in range(len(template)):
+            span = template.span(index)
+            if span.label not in TEMPLATE_FIELDS or span.box is None:
+                continue
+            x1, y1, x2, y2 = span.box
+            region = (max(0, x1 - 5), max(0, y1 - 5), min(1000, x2 + 5), min(1000, y2 + 5))
+            text = self.read_region(image, region)[0]
+            similarity = SequenceMatcher(None, " ".join(normalize_tokens(span.text)), " ".join(normalize_tokens(text))).ratio()
+            if similarity < TEMPLATE_MIN_SIMILARITY:
+                print(f"[ MODEL ] Template check failed for {span.label}: {span.text!r} vs {text!r} ({similarity:.2f})")
+                return False
+            checked += 1
+        return checked > 0
+
+    def read_region(self, image, region):
+        """OCRs a region (x1, y1, x2, y2 on a 0-1000 scale) of the page through a unique temporary file."""
+        x1, y1, x2, y2 = region
+        w, h = image.size
+        crop = image.crop((x1 * w // 1000, y1 * h // 1000, x2 * w // 1000, y2 * h // 1000))
+        fd, crop_path = tempfile.mkstemp(suffix=".png")
+        os.close(fd)
+        try:
+            crop.save(crop_path)
+            return self.run_ocr(crop_path)
+        finally:
+            os.remove(crop_path)
+
+    def extract_spans(self, text, fields=None):
+        """
+        Runs the entity extractor and returns (label, text, start_char, end_char) tuples,
+        optionally only for some fields (the KIE model is then asked for those alone).
+        """
+        self.cpu_budget.set_torch_threads(self.cpu_budget.ner_threads)
+        if isinstance(self.ner_predictor, NERPredictor):
+            spans = self.ner_predictor.predict_spans(text)
+        elif isinstance(self.ner_predictor, CascadeExtractor):
+            spans = self.ner_predictor.predict_spans(text, fields)
+        else:
+            spans = spans_from_prediction(text, self.ner_predictor.predict(text, fields=fields), fields or CATEGORIES)
+        return [span for span in spans if span[0] in fields] if fields else spans
     
     def switchModel(self, new_ocr_type: OCRModelType):
         """Switches the OCR model at runtime."""
-        match(new_ocr_type):
-            case OCRModelType.DOCTR:
-                self.ocr_model = DoctrOCRWrapper()
-            case OCRModelType.PADDLE:
-                self.ocr_model = PaddleOCRWrapper()
+        # Release the old model before loading the new one, so both are never resident together
+        self.memory.forget(f"OCR ({self.ocr_type.value})")
+        self.ocr_model = None
+        gc.collect()
+        with self.memory.measure(f"OCR ({new_ocr_type.value})"):
+            self.ocr_model = self.load_ocr_model(new_ocr_type)
         self.ocr_type = new_ocr_type
\ No newline at end of file
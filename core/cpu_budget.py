@@ -0,0 +1,105 @@
+import os
+import sys
+
+# Thread pools read these variables once, when their native library is first loaded.
+# They must be set before numpy, torch, paddle or cv2 are imported.
+THREAD_ENV_VARS = [
+    "OMP_NUM_THREADS",          # OpenMP (torch, paddle/mkldnn, llama.cpp fallback)
+    "MKL_NUM_THREADS",          # Intel MKL (torch, paddle)
+    "OPENBLAS_NUM_THREADS",     # OpenBLAS (numpy, spaCy/thinc)
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",   # Apple Accelerate
+]
+
+class CPUBudget:
+    """
+    Splits the CPU cores of the machine between server workers and pipeline stages.
+
+    The pipeline stages (preprocessing, OCR, NER, LLM) run one after another inside a
+    request, so each stage may use the full share of its worker. What must not happen
+    is every library sizing its own pool to the whole machine in every worker.
+    """
+    def __init__(
+        self,
+        total_threads=None,
+        workers=1,
+        preprocess_threads=None,
+        ocr_threads=None,
+        ner_threads=None,
+        llm_threads=None,
+    ):
+        self.total_threads = total_threads or os.cpu_count() or 1
+        self.workers = max(1, workers)
+        self.per_worker = max(1, self.total_threads // self.workers)
+        self.preprocess_threads = preprocess_threads or self.per_worker
+        self.ocr_threads = ocr_threads or self.per_worker
+        self.ner_threads = ner_threads or self.per_worker
+        self.llm_threads = llm_threads or self.per_worker
+
+    @classmethod
+    def from_config(cls, config, workers=1):
+        """Builds the budget from config.conf values (0 or missing = derive from CPU_THREADS)."""
+        def read(key):
+            return int(config.get(key, "0")) or None
+        return cls(
+            total_threads=read("CPU_THREADS"),
+            workers=workers,
+            preprocess_threads=read("PREPROCESS_THREADS"),
+            ocr_threads=read("OCR_THREADS"),
+            ner_threads=read("NER_THREADS"),
+            llm_threads=read("LLM_THREADS"),
+        )
+
+    @staticmethod
+    def set_torch_threads(threads):
+        """
+        Sizes torch's intra-op pool for the stage about to run. docTR, Florence-2 and
+        spaCy-transformers share this single pool, so it is resized before each stage.
+        """
+        torch = sys.modules.get("torch")
+        if torch is not None and threads and torch.get_num_threads() != threads:
+            torch.set_num_threads(threads)
+
+    def apply_environment(self):
+        """
+        Sets the thread environment variables. Call before importing any model library.
+        Variables already set by the operator are kept.
+        """
+        for var in THREAD_ENV_VARS:
+            os.environ.setdefault(var, str(self.per_worker))
+        # torch and paddle each ship their own copy of the Intel OpenMP runtime. Both now
+        # receive the same thread count, but the duplicate runtime still has to be allowed.
+        os.environ.setdefault("KMP_DUPLICATE_LIB_OK", "TRUE")
+
+    def apply_runtime(self):
+        """Sizes the pools of libraries that are already imported (torch, OpenCV)."""
+        try:
+            import torch
+            torch.set_num_threads(self.ocr_threads)    # Resized per stage with set_torch_threads
+            try:
+                # The pipeline is sequential, so inter-op parallelism only adds idle threads
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass # Can only be set once, before any parallel work has started
+        except ImportError:
+            pass
+        try:
+            import cv2
+            cv2.setNumThreads(self.preprocess_threads)
+        except ImportError:
+            pass
+
+    def report(self):
+        """Prints the effective thread allocation."""
+        print("[ SERVER ] CPU Budget:")
+        print(f" - Total threads: {self.total_threads} ({self.workers} worker(s), {self.per_worker} per worker)")
+        print(f" - Preprocessing (OpenCV): {self.preprocess_threads}")
+        print(f" - OCR (Paddle/torch): {self.ocr_threads}")
+        print(f" - NER (spaCy/torch): {self.ner_threads}")
+        print(f" - LLM (llama.cpp): {self.llm_threads}")
+        print(f" - BLAS/OpenMP env: {os.environ.get('OMP_NUM_THREADS', 'unset')}")
+        try:
+            import torch
+            print(f" - torch intra-op threads: {torch.get_num_threads()}")
+        except ImportError:
+            pass
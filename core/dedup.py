@@ -0,0 +1,93 @@
+from collections import OrderedDict
+from PIL import Image
+import hashlib
+import numpy as np
+
+HASH_SIZE = 8               # 8x8 low-frequency DCT coefficients -> 64-bit hash
+IMAGE_SIZE = 32             # Images are reduced to 32x32 grayscale before the DCT
+
+EXACT = "exact"             # Same pixels: the cached result is returned as is
+TEMPLATE = "template"       # Same layout: template fields are re-used, the awardee is read again
+MISS = "miss"
+
+def dct_matrix(n):
+    """Orthonormal DCT-II matrix, so that dct(x) = D @ x."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+DCT = dct_matrix(IMAGE_SIZE)
+
+def perceptual_hash(image: Image.Image) -> int:
+    """64-bit pHash: sign of the low DCT frequencies against their median."""
+    gray = np.asarray(image.convert("L").resize((IMAGE_SIZE, IMAGE_SIZE), Image.LANCZOS), dtype=np.float64)
+    low = (DCT @ gray @ DCT.T)[:HASH_SIZE, :HASH_SIZE].flatten()
+    bits = low > np.median(low[1:])     # Skip the DC term, it only encodes brightness
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+def pixel_digest(image: Image.Image) -> str:
+    """Digest of the decoded pixels (ignores file metadata and lossless re-encoding)."""
+    digest = hashlib.sha256(f"{image.mode}{image.size}".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+class PerceptualHashIndex:
+    """
+    Remembers the results of recent certificates by pixel digest and perceptual hash.
+    - exact: identical pixels, no model has to run
+    - template: pHash within max_distance bits, the certificate shares its layout
+      (event, date, location, signatories) with a cached one
+    Entries are evicted least-recently-used after max_entries.
+    """
+    def __init__(self, max_entries=10000, max_distance=10):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.entries = OrderedDict()    # digest -> (phash, result)
+        self.stats = {"lookups": 0, EXACT: 0, TEMPLATE: 0, MISS: 0}
+
+    def lookup(self, image: Image.Image):
+        """Returns (kind, digest, phash, cached_result)."""
+        self.stats["lookups"] += 1
+        digest = pixel_digest(image)
+        if digest in self.entries:
+            self.entries.move_to_end(digest)
+            phash, result = self.entries[digest]
+            self.stats[EXACT] += 1
+            return EXACT, digest, phash, result
+
+        phash = perceptual_hash(image)
+        best_distance, best_result = self.max_distance + 1, None
+        for cached_hash, cached_result in self.entries.values():
+            distance = (phash ^ cached_hash).bit_count()
+            if distance < best_distance:
+                best_distance, best_result = distance, cached_result
+        if best_result is not None:
+            self.stats[TEMPLATE] += 1
+            return TEMPLATE, digest, phash, best_result
+        self.stats[MISS] += 1
+        return MISS, digest, phash, None
+
+    def add(self, digest, phash, result):
+        self.entries[digest] = (phash, result)
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def record_fallback(self):
+        """A template hit that could not be used and went through the full pipeline."""
+        self.stats[TEMPLATE] -= 1
+        self.stats[MISS] += 1
+
+    def report(self):
+        lookups = self.stats["lookups"] or 1
+        return {
+            "entries": len(self.entries),
+            "lookups": self.stats["lookups"],
+            "exact_hits": self.stats[EXACT],
+            "template_hits": self.stats[TEMPLATE],
+            "misses": self.stats[MISS],
+            "exact_hit_rate": round(self.stats[EXACT] / lookups, 4),
+            "template_hit_rate": round(self.stats[TEMPLATE] / lookups, 4),
+        }
@@ -1,9 +1,6 @@
 import torch 
 from doctr.io import DocumentFile
 from doctr.models import ocr_predictor
-import os
-
-os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
 class DoctrOCRWrapper:
     def __init__(self):
@@ -18,6 +15,11 @@ class DoctrOCRWrapper:
 
     def predict(self, path, type='image'):
         """Performs OCR on the given image and returns the corrected text."""
+        text, words, boxes, _ = self.predict_words(path, type)
+        return text, words, boxes
+
+    def predict_words(self, path, type='image'):
+        """Like predict, but also returns the confidence of every word."""
         # Re-run prediction on the original image and print bounding boxes for each word
         if type == 'image':
             doc_for_boxes = DocumentFile.from_images(path)
@@ -27,6 +29,7 @@ class DoctrOCRWrapper:
         
         words = []
         boxes = []
+        scores = []
 
         TRESHOLD = 0.55
         # 'result_for_boxes' is a Document object
@@ -84,4 +87,5 @@ class DoctrOCRWrapper:
 
                     words.append(value)
                     boxes.append([norm_x_top_left, norm_y_top_left, norm_x_bottom_right, norm_y_bottom_right])
-        return " ".join(words), words, boxes
+                    scores.append(float(word['confidence']))
+        return " ".join(words), words, boxes, scores
@@ -0,0 +1,62 @@
+from llama_cpp import Llama
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+from core.model_manager import local_gguf_path
+import numpy as np
+
+def load_llama(repo_id, filename, n_ctx, n_threads=None, draft_model: LlamaDraftModel | None = None):
+    """Loads a prefetched GGUF model (see core/model_manager.py) with llama.cpp."""
+    print(f"Loading model: {filename} ({repo_id})...")
+    model_path = local_gguf_path(filename)
+    return Llama(
+        model_path=model_path,
+        n_ctx=n_ctx,                  # Context window
+        use_mmap=True,                # Weights are paged in from the file, shared between workers
+        n_gpu_layers=-1,              # -1 = Offload all to GPU if available, otherwise CPU
+        n_threads=n_threads,          # None = llama.cpp default
+        n_threads_batch=n_threads,
+        draft_model=draft_model,      # Speculative decoding (None = token by token)
+        verbose=False
+    )
+
+class LlamaModelDraft(LlamaDraftModel):
+    """
+    Drafts tokens greedily with a smaller llama.cpp model that shares the tokenizer of the
+    target model (Qwen2.5-3B drafting for Qwen2.5-7B). The target verifies every drafted
+    token, so greedy outputs are the same as without a draft model.
+    """
+    def __init__(self, llm: Llama, num_pred_tokens=4):
+        self.llm = llm
+        self.num_pred_tokens = num_pred_tokens
+
+    def __call__(self, input_ids, /, **kwargs):
+        # The draft context is smaller than the target one: stop drafting instead of overflowing
+        if len(input_ids) + self.num_pred_tokens >= self.llm.n_ctx():
+            return np.array([], dtype=np.intc)
+        draft = []
+        # reset=True re-uses the longest common prefix of the draft model's KV cache
+        for token in self.llm.generate(input_ids.tolist(), top_k=1, temp=0.0, reset=True):
+            if token == self.llm.token_eos():
+                break
+            draft.append(token)
+            if len(draft) >= self.num_pred_tokens:
+                break
+        return np.array(draft, dtype=np.intc)
+
+def make_draft_model(mode, num_pred_tokens=10, draft_llm: Llama | None = None):
+    """
+    Builds the draft model for speculative decoding.
+    - off:   no speculation
+    - ngram: prompt lookup, copies spans of the prompt (the OCR text) that match the last tokens
+    - draft: a smaller loaded model (falls back to ngram if none is available)
+    """
+    match(mode):
+        case "off":
+            return None
+        case "ngram":
+            return LlamaPromptLookupDecoding(num_pred_tokens=num_pred_tokens)
+        case "draft":
+            if draft_llm is None:
+                print("[ MODEL ] No draft model loaded, using n-gram prompt lookup instead.")
+                return LlamaPromptLookupDecoding(num_pred_tokens=num_pred_tokens)
+            return LlamaModelDraft(draft_llm, num_pred_tokens=num_pred_tokens)
+    raise ValueError(f"Unknown speculative decoding mode '{mode}'. Expected off, ngram or draft.")
@@ -1,41 +1,87 @@
 from llama_cpp import Llama
-from huggingface_hub import hf_hub_download
-from core.utils import resource_path
+from llama_cpp.llama_speculative import LlamaDraftModel
+from core.llm_engine import load_llama
+from core.prompt_builder import PromptBuilder
 import json
 import re
+import time
 
 # --- CONFIGURATION ---
 REPO_ID = "bartowski/Qwen2.5-7B-Instruct-GGUF"
 FILENAME = "Qwen2.5-7B-Instruct-Q4_K_M.gguf"
-LOCAL_MODEL_DIR = resource_path("models")
+N_CTX = 8192
+MAX_TOKENS = 1024
+FIELD_TOKENS = 128          # Output budget per field when only some fields are requested
+
+# Field descriptions of the JSON schema, in output order
+FIELD_SCHEMA = {
+    "TYPE": '"Type of document (e.g., Certificate of Participation)"',
+    "AWARDEE": '"Full name of the recipient"',
+    "ROLE": '"Role of the awardee (e.g., Speaker, Participant)"',
+    "EVENT": '"Name of the event (Corrected spelling)"',
+    "DATE": '"Date of the event"',
+    "LOCATION": '"Venue/Location"',
+    "SIGNATORIES": '["List of names (Person Only)."]',
+    "SIGNATORY_TITLES": '["List of titles corresponding to the signatories."]',
+}
+
+def schema_block(fields):
+    """JSON schema listing only the given fields."""
+    lines = [f'  "{field}": {FIELD_SCHEMA[field]}' for field in fields]
+    return "{\n" + ",\n".join(lines) + "\n}"
+
+def context_block(context):
+    """Fields already extracted by another model, given to the LLM as context."""
+    if not context:
+        return ""
+    lines = [f"{label}: {'; '.join(values)}" for label, values in context.items() if values]
+    return "Already extracted (correct, do not return these fields):\n" + "\n".join(lines) + "\n\n"
+
+# Extra rules used when the post-processing step is fused into the extraction prompt
+CLEANUP_RULES = """
+4. **TEXT CLEANUP (no separate post-processing step runs before you):**
+   - Fix run-together words: "CERTIFICATEOF" -> "CERTIFICATE OF".
+   - Remove random letters and broken fragments coming from logos and seals (e.g. "AD", "vsu").
+   - Do NOT translate Filipino words. Keep "Unibersidad ng Pilipinas", "Gawad", "Pagkilala" exactly as written.
+   - Remove slashes (/), underscores (_) or stray dots inside names: "EULOGIO /S.LABAO" -> "Eulogio S. Labao".
+   - Use Title Case for names: "WENIFEL" -> "Wenifel", "DrWinifelP. Carmina" -> "Dr. Winifel P. Carmina".
+"""
 
 class LLMKIEPredictor:
-    def __init__(self):
-        print(f"Loading Model: {FILENAME}...")
-        self.model_path = hf_hub_download(
-            repo_id=REPO_ID,
-            filename=FILENAME,
-            local_dir=LOCAL_MODEL_DIR,
-            local_dir_use_symlinks=False
+    def __init__(
+        self,
+        n_threads=None,
+        llm: Llama | None = None,
+        fused=False,
+        draft_model: LlamaDraftModel | None = None,
+        temperature=0.1,
+        max_input_tokens=None,
+    ):
+        self.llm = llm if llm is not None else load_llama(
+            REPO_ID, FILENAME, n_ctx=N_CTX, n_threads=n_threads, draft_model=draft_model
         )
-        self.llm = Llama(
-            model_path=self.model_path,
-            n_ctx=8192,
-            n_gpu_layers=-1,
-            verbose=False
+        # fused=True: the prompt also does the OCR clean-up of LLMPostProcessor in the same pass
+        self.fused = fused
+        self.temperature = temperature  # 0.0 = greedy (identical output with or without speculation)
+        self.prompt_builder = PromptBuilder(
+            self.llm, self.get_prompt, MAX_TOKENS, max_input_tokens=max_input_tokens, name="KIE"
         )
 
     def extract_json_block(self, text):
         match = re.search(r"\{[\s\S]*\}", text)
         return match.group(0) if match else None
 
-    def predict(self, ocr_text: str):
+    def get_prompt(self, ocr_text: str, fields=None, context=None):
+        """
+        fields: schema fields to extract (None = all of them)
+        context: {label: [values]} already known, e.g. from spaCy in the cascade extractor
+        """
         # --- IMPROVED PROMPT STRATEGY ---
         # 1. Added explicit instruction to exclude the Awardee from Signatories.
         # 2. Added specific examples of what NOT to include (Project names).
         # 3. Forced OCR correction for "IRAINING".
         
-        prompt = f"""<|im_start|>system
+        return f"""<|im_start|>system
 You are a Document Entity Extraction Engine. 
 Your task is to parse messy OCR text and return a cleaned JSON object.
 
@@ -53,33 +99,42 @@ Your task is to parse messy OCR text and return a cleaned JSON object.
 
 3. **N/A HANDLING:** 
    - If any field is missing or cannot be determined, use "N/A" for strings and an empty list for arrays.
-
+{CLEANUP_RULES if self.fused else ""}
 ### JSON SCHEMA
-{{
-  "TYPE": "Type of document (e.g., Certificate of Participation)",
-  "AWARDEE": "Full name of the recipient",
-  "ROLE": "Role of the awardee (e.g., Speaker, Participant)",
-  "EVENT": "Name of the event (Corrected spelling)",
-  "DATE": "Date of the event",
-  "LOCATION": "Venue/Location",
-  "SIGNATORIES": ["List of names (Person Only)."],
-  "SIGNATORY_TITLES": ["List of titles corresponding to the signatories."]
-}}
+{schema_block(fields or FIELD_SCHEMA)}
 <|im_end|>
 <|im_start|>user
-Raw OCR Text:
+{context_block(context)}Raw OCR Text:
 "{ocr_text}"
 <|im_end|>
 <|im_start|>assistant
 """
-        
+
+    def predict(self, ocr_text: str, fields=None, context=None):
+        """
+        Extracts the schema fields from the OCR text. With fields, only those are requested
+        and the output budget shrinks with them; context lists fields that are already known.
+        """
+        if fields:
+            template = lambda text: self.get_prompt(text, fields, context)
+            max_tokens = min(MAX_TOKENS, FIELD_TOKENS * len(fields))
+        else:
+            template, max_tokens = None, MAX_TOKENS
+        prompt = self.prompt_builder.build(ocr_text, template)
+
+        start = time.perf_counter()
         response = self.llm(
             prompt,
-            max_tokens=1024,
-            temperature=0.1,  # Keep low to force strict adherence
+            max_tokens=max_tokens,
+            temperature=self.temperature,  # Keep low to force strict adherence
             stop=["<|im_end|>"],
             echo=False
         )
+        elapsed = time.perf_counter() - start
+        completion_tokens = response["usage"]["completion_tokens"]
+        self.last_completion_tokens = completion_tokens
+        self.last_seconds = elapsed
+        print(f"[ MODEL ] KIE generated {completion_tokens} tokens in {elapsed:.2f}s ({completion_tokens / elapsed:.1f} tok/s)")
 
         output_text = response["choices"][0]["text"].strip()
 
@@ -89,6 +144,8 @@ Raw OCR Text:
         if json_text:
             try:
                 data = json.loads(json_text)
+                if fields:
+                    data = {key: value for key, value in data.items() if key in fields}
                 # Enforce List format
                 for key in data:
                     if not isinstance(data[key], list):
@@ -2,19 +2,66 @@ from PIL import Image
 from transformers import AutoProcessor, AutoModelForCausalLM
 from unittest.mock import patch
 from transformers.dynamic_module_utils import check_imports
+from core.model_manager import local_snapshot_dir
+import torch
+import time
 
+# --- CONFIGURATION FOR FLORENCE-2 ---
+MODEL_VARIANTS = {
+    "base": "microsoft/Florence-2-base",     # ~0.23B params, much faster on CPU
+    "large": "microsoft/Florence-2-large",   # ~0.77B params, more accurate
+}
+
+# Decoding/quantization profiles
+# - accuracy: the original settings (fp32 weights, beam search, long outputs)
+# - fast:     int8 dynamic quantization of the Linear layers + greedy decoding
+PROFILES = {
+    "accuracy": {
+        "quantize": False,
+        "num_beams": 3,
+        "max_new_tokens": 1024,
+    },
+    "fast": {
+        "quantize": True,
+        "num_beams": 1,
+        "max_new_tokens": 512,
+    },
+}
 
 class LLMOCRWrapper:
-    def __init__(self):
-        self.model_id = "microsoft/Florence-2-large"
+    def __init__(self, variant="large", profile="accuracy", num_threads=None):
+        if variant not in MODEL_VARIANTS:
+            raise ValueError(f"Unknown Florence-2 variant '{variant}'. Expected one of {list(MODEL_VARIANTS)}.")
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown LLM OCR profile '{profile}'. Expected one of {list(PROFILES)}.")
+
+        self.variant = variant
+        self.profile = profile
+        self.settings = PROFILES[profile]
+        self.model_id = MODEL_VARIANTS[variant]
+        self.model_path = local_snapshot_dir(self.model_id)
+
+        # Limit torch intra-op threads (None = leave torch default)
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
         # Apply the fix specifically during the load
         with patch("transformers.dynamic_module_utils.check_imports", self.fixed_check_imports):
             self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_id,
-                trust_remote_code=True
+                self.model_path,
+                trust_remote_code=True,
+                local_files_only=True
             ).to("cpu")
+        self.model.eval()
 
-        self.processor = AutoProcessor.from_pretrained(self.model_id, trust_remote_code=True)
+        if self.settings["quantize"]:
+            # Dynamic int8 quantization: weights are stored in int8, activations quantized on the fly.
+            self.model = torch.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+        self.processor = AutoProcessor.from_pretrained(self.model_path, trust_remote_code=True, local_files_only=True)
+        print(f"[ MODEL ] Florence-2 loaded: variant={variant}, profile={profile}, threads={torch.get_num_threads()}")
 
     def fixed_check_imports(self, filename):
         try:
@@ -26,21 +73,32 @@ class LLMOCRWrapper:
             raise e
 
     def predict(self, image_path):
+        text, _, _, _ = self.predict_words(image_path)
+        return text
+
+    def predict_words(self, image_path):
+        """Returns the text plus its lines and boxes (0-1000 scale). Florence-2 gives no scores (-1)."""
         image = Image.open(image_path).convert("RGB")
 
         # Define Prompt
         prompt = "<OCR_WITH_REGION>"
 
         print("Processing image...")
+        start = time.perf_counter()
         inputs = self.processor(text=prompt, images=image, return_tensors="pt")
 
-        generated_ids = self.model.generate(
-            input_ids=inputs["input_ids"],
-            pixel_values=inputs["pixel_values"],
-            max_new_tokens=1024,
-            do_sample=False,
-            num_beams=3,
-        )
+        num_beams = self.settings["num_beams"]
+        # early_stopping only applies to beam search (transformers warns about it otherwise)
+        beam_options = {"early_stopping": True} if num_beams > 1 else {}
+        with torch.inference_mode():
+            generated_ids = self.model.generate(
+                input_ids=inputs["input_ids"],
+                pixel_values=inputs["pixel_values"],
+                max_new_tokens=self.settings["max_new_tokens"],
+                do_sample=False,
+                num_beams=num_beams,
+                **beam_options,         # Stop as soon as every beam has emitted </s>
+            )
 
         generated_text = self.processor.batch_decode(generated_ids, skip_special_tokens=False)[0]
         parsed_answer = self.processor.post_process_generation(
@@ -48,10 +106,26 @@ class LLMOCRWrapper:
             task=prompt,
             image_size=(image.width, image.height)
         )
+        elapsed = time.perf_counter() - start
+        new_tokens = generated_ids.shape[-1]
+        print(f"[ MODEL ] Florence-2 ({self.variant}/{self.profile}) OCR took {elapsed:.2f}s, {new_tokens} tokens")
+        if new_tokens >= self.settings["max_new_tokens"]:
+            # Every line costs 8 location tokens; the lines cut off are the last ones (signatories)
+            print(f"[ MODEL ] Warning: Florence-2 reached max_new_tokens={self.settings['max_new_tokens']}, "
+                  f"the end of the page may be missing. Use the accuracy profile for dense certificates.")
 
         if '<OCR_WITH_REGION>' in parsed_answer:
-            lines = parsed_answer['<OCR_WITH_REGION>']['labels']
-            return lines.replace('<line>', '').replace('</line>', '\n').strip()
+            # 'labels' is a list with one entry per detected text line
+            region = parsed_answer['<OCR_WITH_REGION>']
+            words, boxes = [], []
+            for label, quad in zip(region['labels'], region['quad_boxes']):
+                # quad is [x1, y1, x2, y2, x3, y3, x4, y4] in pixels
+                words.append(label.replace('</s>', '').replace('<s>', '').strip())
+                boxes.append([
+                    int(min(quad[0::2]) / image.width * 1000), int(min(quad[1::2]) / image.height * 1000),
+                    int(max(quad[0::2]) / image.width * 1000), int(max(quad[1::2]) / image.height * 1000),
+                ])
+            return "\n".join(words).strip(), words, boxes, [-1.0] * len(words)
         else:
             print("No text regions found.")
-            return ""
\ No newline at end of file
+            return "", [], [], []
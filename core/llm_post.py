@@ -1,30 +1,22 @@
-from huggingface_hub import hf_hub_download
 from llama_cpp import Llama
 import re
 import traceback
-from core.utils import resource_path
+from core.llm_engine import load_llama
+from core.prompt_builder import PromptBuilder
 
 # --- CONFIGURATION FOR QWEN 2.5 3B ---
 # We use the official Qwen GGUF repo or a reliable community one (Bartowski is highly reliable)
 REPO_ID = "Qwen/Qwen2.5-3B-Instruct-GGUF"
 FILENAME = "qwen2.5-3b-instruct-q4_k_m.gguf"
-
-LOCAL_MODEL_DIR = resource_path("models")
+N_CTX = 4096
+MAX_TOKENS = 2048
 
 class LLMPostProcessor:
-    def __init__(self):
-        print(f"Loading model: {FILENAME}...")
-        self.model_path = hf_hub_download(
-            repo_id=REPO_ID,
-            filename=FILENAME,
-            local_dir=LOCAL_MODEL_DIR,
-            local_dir_use_symlinks=False
-        )
-        self.llm = Llama(
-            model_path=self.model_path,
-            n_ctx=4096,           # Context window
-            n_gpu_layers=-1,      # -1 = Offload all to GPU if available, otherwise CPU
-            verbose=False
+    def __init__(self, n_threads=None, llm: Llama | None = None, max_input_tokens=None):
+        # An already loaded engine can be shared with the KIE predictor (both use Qwen ChatML)
+        self.llm = llm if llm is not None else load_llama(REPO_ID, FILENAME, n_ctx=N_CTX, n_threads=n_threads)
+        self.prompt_builder = PromptBuilder(
+            self.llm, self.getPromptQwen, MAX_TOKENS, max_input_tokens=max_input_tokens, name="Post-processing"
         )
 
     def getPromptQwen(self, dirty_text):
@@ -72,11 +64,11 @@ Raw Text:
     def predict(self, dirty_text):
         try:
             # Switch to the Qwen prompt generator
-            prompt = self.getPromptQwen(dirty_text)
+            prompt = self.prompt_builder.build(dirty_text)
             
             output = self.llm(
                 prompt,
-                max_tokens=2048,        # Increased slightly for longer certificates
+                max_tokens=MAX_TOKENS,  # Increased slightly for longer certificates
                 stop=["<|im_end|>"],    # Qwen's specific stop token
                 echo=False,
                 temperature=0.1,        # Low temp = more deterministic/faithful to original text
@@ -0,0 +1,97 @@
+from contextlib import contextmanager
+import gc
+import os
+import tracemalloc
+import psutil
+
+MB = 1024 * 1024
+
+def rss_bytes():
+    """Resident set size of this process."""
+    return psutil.Process(os.getpid()).memory_info().rss
+
+class MemoryTracker:
+    """
+    Records the resident memory added by every model at load time and, when tracing is
+    enabled, the Python allocations that grew since the models were loaded.
+    Note: llama.cpp memory-maps GGUF weights, so their pages are counted as they are touched.
+    """
+    def __init__(self, trace=False, frames=1):
+        self.model_sizes = {}   # name -> bytes added to RSS while loading
+        self.baseline = None
+        self.trace = trace
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+
+    @contextmanager
+    def measure(self, name):
+        gc.collect()
+        before = rss_bytes()
+        yield
+        gc.collect()
+        self.model_sizes[name] = max(0, rss_bytes() - before)
+        print(f"[ MEMORY ] {name}: +{self.model_sizes[name] / MB:.0f} MB resident (total {rss_bytes() / MB:.0f} MB)")
+
+    def forget(self, name):
+        self.model_sizes.pop(name, None)
+
+    def mark_baseline(self):
+        """Takes the tracemalloc snapshot later snapshots are compared against (after model load)."""
+        if self.trace:
+            self.baseline = tracemalloc.take_snapshot()
+
+    def snapshot(self, top=15):
+        """Current RSS, per-model sizes and, with tracing, the largest allocation growth."""
+        report = {
+            "pid": os.getpid(),
+            "rss_mb": round(rss_bytes() / MB, 1),
+            "models_mb": {name: round(size / MB, 1) for name, size in self.model_sizes.items()},
+            "tracemalloc": None,
+        }
+        if self.trace:
+            current = tracemalloc.take_snapshot()
+            traced, peak = tracemalloc.get_traced_memory()
+            if self.baseline is not None:
+                stats = current.compare_to(self.baseline, "lineno")[:top]
+                top_stats = [{"location": str(stat.traceback), "size_diff_kb": round(stat.size_diff / 1024, 1),
+                              "count_diff": stat.count_diff} for stat in stats]
+            else:
+                stats = current.statistics("lineno")[:top]
+                top_stats = [{"location": str(stat.traceback), "size_kb": round(stat.size / 1024, 1),
+                              "count": stat.count} for stat in stats]
+            report["tracemalloc"] = {
+                "traced_mb": round(traced / MB, 1),
+                "peak_mb": round(peak / MB, 1),
+                "top": top_stats,
+            }
+        return report
+
+class WorkerRecycler:
+    """
+    Decides when a server worker should be replaced: after max_requests requests or when
+    its RSS exceeds max_rss_mb (0 disables a limit). The worker then shuts down gracefully
+    and the supervisor starts a fresh one.
+    """
+    def __init__(self, max_requests=0, max_rss_mb=0):
+        self.max_requests = max_requests
+        self.max_rss_mb = max_rss_mb
+        self.requests = 0
+        self.triggered = False
+
+    @property
+    def enabled(self):
+        return bool(self.max_requests or self.max_rss_mb)
+
+    def after_request(self):
+        """Counts a finished request. Returns the reason to recycle once, None otherwise."""
+        self.requests += 1
+        if self.triggered or not self.enabled:
+            return None
+        reason = None
+        if self.max_requests and self.requests >= self.max_requests:
+            reason = f"served {self.requests} requests"
+        elif self.max_rss_mb and rss_bytes() / MB >= self.max_rss_mb:
+            reason = f"RSS {rss_bytes() / MB:.0f} MB >= {self.max_rss_mb} MB"
+        if reason:
+            self.triggered = True
+        return reason
@@ -0,0 +1,201 @@
+# Model artifact manager
+# Every artifact the configured pipeline needs is downloaded once into models/ with
+#   python -m core.model_manager prefetch        (or: CertificateEntityRecognition prefetch)
+# and checked with
+#   python -m core.model_manager verify [--full]
+# At runtime the model libraries are switched to offline mode and only read from models/.
+import hashlib
+import json
+import os
+import sys
+from core.utils import read_config, resource_path
+
+LOCAL_MODEL_DIR = resource_path("models")
+MANIFEST_PATH = LOCAL_MODEL_DIR / "manifest.json"
+DOCTR_DIR = LOCAL_MODEL_DIR / "doctr"
+PADDLEX_DIR = LOCAL_MODEL_DIR / "paddlex"
+SPACY_DIR = LOCAL_MODEL_DIR / "spacy-trf-model"
+
+class MissingModelError(RuntimeError):
+    """Raised when a model artifact is not available locally."""
+
+def apply_cache_environment():
+    """Points the docTR and paddlex caches at models/. They are read when the libraries are imported."""
+    os.environ["DOCTR_CACHE_DIR"] = str(DOCTR_DIR)
+    os.environ["PADDLE_PDX_CACHE_HOME"] = str(PADDLEX_DIR)
+
+def apply_local_environment():
+    """Points every model library at models/ and disables network access. Call before importing them."""
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    apply_cache_environment()
+    os.environ["PADDLE_PDX_DISABLE_MODEL_SOURCE_CHECK"] = "True"
+
+def local_gguf_path(filename):
+    """Returns the path of a downloaded GGUF file or raises MissingModelError."""
+    path = LOCAL_MODEL_DIR / filename
+    if not path.is_file():
+        raise MissingModelError(f"{filename} not found in {LOCAL_MODEL_DIR}. Run the 'prefetch' command first.")
+    return str(path)
+
+def local_snapshot_dir(repo_id):
+    """Returns the local directory of a Hugging Face snapshot or raises MissingModelError."""
+    path = LOCAL_MODEL_DIR / repo_id.split("/")[-1]
+    if not (path / "config.json").is_file():
+        raise MissingModelError(f"{repo_id} not found in {path}. Run the 'prefetch' command first.")
+    return str(path)
+
+def required_artifacts(config):
+    """Lists the artifacts needed by the pipeline described in config.conf."""
+    from core import llm_post, llm_kie
+
+    ocr_model = config.get("OCR_MODEL", "paddle").lower()
+    ner_model = config.get("NER_MODEL", "LLM").lower()
+    with_post = config.get("HAS_LLM_POSTPROCESSING", "True").lower() == "true"
+    llm_mode = config.get("LLM_MODE", "separate").lower()
+
+    artifacts = []
+    match(ocr_model):
+        case "doctr":
+            artifacts.append({"name": "doctr", "kind": "doctr", "path": DOCTR_DIR})
+        case "llm":
+            from core.llm_ocr import MODEL_VARIANTS
+            repo_id = MODEL_VARIANTS[config.get("LLM_OCR_VARIANT", "large").lower()]
+            artifacts.append({"name": repo_id, "kind": "snapshot", "repo_id": repo_id,
+                              "path": LOCAL_MODEL_DIR / repo_id.split("/")[-1]})
+        case _:
+            artifacts.append({"name": "paddleocr", "kind": "paddle", "path": PADDLEX_DIR})
+
+    needs_kie = ner_model in ("llm", "cascade")
+    if needs_kie:
+        artifacts.append({"name": llm_kie.FILENAME, "kind": "gguf", "repo_id": llm_kie.REPO_ID,
+                          "path": LOCAL_MODEL_DIR / llm_kie.FILENAME})
+    if ner_model != "llm":
+        artifacts.append({"name": "spacy-trf-model", "kind": "local", "path": SPACY_DIR})
+    # Shared/fused modes serve post-processing with the KIE model
+    if with_post and (llm_mode == "separate" or not needs_kie):
+        artifacts.append({"name": llm_post.FILENAME, "kind": "gguf", "repo_id": llm_post.REPO_ID,
+                          "path": LOCAL_MODEL_DIR / llm_post.FILENAME})
+    return artifacts
+
+def sha256_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def artifact_files(artifact):
+    """All files belonging to an artifact, relative to models/."""
+    path = artifact["path"]
+    if path.is_file():
+        return [path.relative_to(LOCAL_MODEL_DIR).as_posix()]
+    files = []
+    for root, _, names in os.walk(path):
+        for name in names:
+            full = os.path.join(root, name)
+            # Skip download bookkeeping (locks, .cache/huggingface metadata)
+            if ".cache" in full or name.endswith(".lock"):
+                continue
+            files.append(os.path.relpath(full, LOCAL_MODEL_DIR).replace(os.sep, "/"))
+    return sorted(files)
+
+def read_manifest():
+    if MANIFEST_PATH.is_file():
+        with open(MANIFEST_PATH, "r") as f:
+            return json.load(f)
+    return {}
+
+def download_artifact(artifact):
+    """Downloads one artifact into models/."""
+    match(artifact["kind"]):
+        case "gguf":
+            from huggingface_hub import hf_hub_download
+            hf_hub_download(repo_id=artifact["repo_id"], filename=artifact["name"], local_dir=LOCAL_MODEL_DIR)
+        case "snapshot":
+            from huggingface_hub import snapshot_download
+            snapshot_download(repo_id=artifact["repo_id"], local_dir=artifact["path"])
+        case "doctr":
+            # Building the predictor downloads the detection, recognition and orientation weights
+            from core.doctr_ocr import DoctrOCRWrapper
+            DoctrOCRWrapper()
+        case "paddle":
+            from core.paddle_ocr import PaddleOCRWrapper
+            PaddleOCRWrapper()
+        case "local":
+            pass # Shipped with the application
+
+def prefetch(config):
+    """Downloads and checksums every artifact the configured pipeline needs."""
+    # Library caches must point at models/ before the libraries are imported
+    if "paddlex" in sys.modules or "doctr" in sys.modules:
+        raise RuntimeError("prefetch must run before paddlex/docTR are imported, their cache directories are already fixed")
+    apply_cache_environment()
+    manifest = read_manifest()
+    for artifact in required_artifacts(config):
+        print(f"[ MODELS ] Fetching {artifact['name']}...")
+        download_artifact(artifact)
+        files = {}
+        for relative in artifact_files(artifact):
+            full = LOCAL_MODEL_DIR / relative
+            files[relative] = {"size": full.stat().st_size, "sha256": sha256_file(full)}
+        if not files:
+            raise MissingModelError(f"{artifact['name']} produced no files in {artifact['path']}")
+        manifest[artifact["name"]] = {"kind": artifact["kind"], "files": files}
+        print(f"[ MODELS ] {artifact['name']}: {len(files)} file(s) checksummed")
+    with open(MANIFEST_PATH, "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"[ MODELS ] Manifest written to {MANIFEST_PATH}")
+
+def verify(config, full=False):
+    """
+    Checks the artifacts of the configured pipeline against the manifest.
+    Sizes are always checked; full=True also recomputes the SHA-256 of every file.
+    Returns a list of problems (empty when everything is in place).
+    """
+    manifest = read_manifest()
+    problems = []
+    for artifact in required_artifacts(config):
+        entry = manifest.get(artifact["name"])
+        if entry is None:
+            if artifact["kind"] == "local" and artifact["path"].exists():
+                continue # Shipped with the application, not downloaded
+            problems.append(f"{artifact['name']}: not prefetched")
+            continue
+        for relative, expected in entry["files"].items():
+            full_path = LOCAL_MODEL_DIR / relative
+            if not full_path.is_file():
+                problems.append(f"{artifact['name']}: missing {relative}")
+            elif full_path.stat().st_size != expected["size"]:
+                problems.append(f"{artifact['name']}: size mismatch for {relative}")
+            elif full and sha256_file(full_path) != expected["sha256"]:
+                problems.append(f"{artifact['name']}: checksum mismatch for {relative}")
+    return problems
+
+def report(problems):
+    """Prints the result of verify()."""
+    if not problems:
+        print("[ MODELS ] All model artifacts are available locally.")
+        return
+    print("[ MODELS ] Missing or damaged model artifacts:")
+    for problem in problems:
+        print(f" - {problem}")
+    print("[ MODELS ] Run the 'prefetch' command with network access to download them.")
+
+def main(argv):
+    command = argv[0] if argv else "verify"
+    config = read_config()
+    match(command):
+        case "prefetch":
+            prefetch(config)
+            report(verify(config, full=False))
+        case "verify":
+            problems = verify(config, full="--full" in argv)
+            report(problems)
+            sys.exit(1 if problems else 0)
+        case _:
+            print("Usage: python -m core.model_manager [prefetch | verify [--full]]")
+            sys.exit(2)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,11 +1,12 @@
 from paddleocr import PaddleOCR
+from PIL import Image
 
 class PaddleOCRWrapper:
-    def __init__(self):
+    def __init__(self, cpu_threads=4):
         self.ocr = PaddleOCR(
             lang="en",
             enable_mkldnn=True,       # KEEP: Critical for CPU speed
-            cpu_threads=4,            # Adjust to your core count
+            cpu_threads=cpu_threads,  # Set from the CPU budget
             ocr_version='PP-OCRv4',
             use_angle_cls=True,
         )
@@ -34,6 +35,10 @@ class PaddleOCRWrapper:
             # Fallback for malformed box data
             return (float('inf'), float('inf'))
         
+    def sort_tuples(self, ocr_data):
+        """Orders (text, score, polys) tuples top-to-bottom, left-to-right."""
+        return sorted(ocr_data, key=lambda item: self.get_sort_key_robust(item, y_tolerance=30))
+
     def sort_ocr_tuples(self, ocr_data):
         """
         Sorts OCR result tuples (line, score, polys) using Y-axis tolerance
@@ -44,7 +49,7 @@ class PaddleOCRWrapper:
             y_tolerance (int): Maximum vertical distance (in pixels) for two
                             lines to be considered part of the same row.
         """
-        sorted_data = sorted(ocr_data, key=lambda item: self.get_sort_key_robust(item, y_tolerance=30))
+        sorted_data = self.sort_tuples(ocr_data)
         ocr_text_lines = []
         
         for item in sorted_data:
@@ -56,9 +61,11 @@ class PaddleOCRWrapper:
         
         return ocr_text
 
-    def predict(self, img_path):
+    def read_lines(self, img_path, upright=False):
+        """Runs PaddleOCR and returns the (text, score, polys) tuples above the score threshold."""
         result = self.ocr.predict(
-            img_path
+            img_path,
+            use_textline_orientation=not upright,   # Upright pages skip the angle classifier
         )
 
         document = []
@@ -68,5 +75,23 @@ class PaddleOCRWrapper:
                 if(res['rec_scores'][i] < 0.5):
                     continue
                 document.append((line, res['rec_scores'][i], res['rec_polys'][i]))
+        return document
+
+    def predict(self, img_path):
+        return self.sort_ocr_tuples(self.read_lines(img_path))
 
-        return self.sort_ocr_tuples(document)
+    def predict_words(self, img_path, upright=False):
+        """Returns the text plus its lines, boxes (0-1000 scale) and recognition scores."""
+        document = self.sort_tuples(self.read_lines(img_path, upright))
+        w, h = Image.open(img_path).size
+        words, boxes, scores = [], [], []
+        for text, score, polys in document:
+            x_coords = [point[0] for point in polys]
+            y_coords = [point[1] for point in polys]
+            words.append(text)
+            boxes.append([
+                int(min(x_coords) / w * 1000), int(min(y_coords) / h * 1000),
+                int(max(x_coords) / w * 1000), int(max(y_coords) / h * 1000),
+            ])
+            scores.append(float(score))
+        return " ".join(words).strip(), words, boxes, scores
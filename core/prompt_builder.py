@@ -0,0 +1,122 @@
+from llama_cpp import Llama
+import re
+
+MAX_REPEAT_NGRAM = 8        # Longest word sequence checked for back-to-back repeats
+MIN_DEDUP_LINE_WORDS = 3    # Shorter lines ("Director") may legitimately repeat
+HEAD_SHARE = 2 / 3          # Share of the budget kept from the start of an over-long text
+ELLIPSIS = " ... "
+
+def is_junk_token(token):
+    """Tokens that come from seals, logos and borders rather than from text."""
+    alnum = sum(ch.isalnum() for ch in token)
+    if alnum == 0:
+        return token not in ("&", "-")
+    # e.g. "'}$a" or "~~|l;" - mostly symbols with a stray letter
+    return len(token) >= 4 and alnum / len(token) < 0.4
+
+def collapse_repeats(words):
+    """Removes back-to-back repeated word sequences ("REPUBLIC OF X REPUBLIC OF X")."""
+    for n in range(MAX_REPEAT_NGRAM, 0, -1):
+        i = 0
+        while i + 2 * n <= len(words):
+            first = [w.lower() for w in words[i:i + n]]
+            second = [w.lower() for w in words[i + n:i + 2 * n]]
+            # Single words must be 3+ characters (keep initials like "S. S.")
+            if first == second and (n > 1 or len(first[0]) > 2):
+                del words[i + n:i + 2 * n]
+            else:
+                i += 1
+    return words
+
+def compact_ocr_text(text):
+    """
+    Shrinks raw OCR text before it is inserted into a prompt:
+    - drops repeated lines of 3+ words (headers/footers recognized twice); only line-based
+      output (Florence-2) has lines, PaddleOCR and docTR text is a single line
+    - drops tokens that are mostly symbols (ornaments, seals, logos); OCR scores are not used
+    - collapses back-to-back repeated phrases and punctuation runs
+    """
+    seen = set()
+    lines = []
+    for line in text.splitlines():
+        words = [w for w in line.split() if not is_junk_token(w)]
+        key = re.sub(r"\W+", "", line).lower()
+        if not key:
+            continue
+        if len(words) >= MIN_DEDUP_LINE_WORDS:
+            if key in seen:
+                continue
+            seen.add(key)
+        words = collapse_repeats(words)
+        if words:
+            lines.append(" ".join(words))
+    compact = "\n".join(lines)
+    # ",,,," -> ","   "----" -> "-"
+    compact = re.sub(r"([^\w\s])\1+", r"\1", compact)
+    return compact
+
+class PromptBuilder:
+    """
+    Builds a prompt from a template and OCR text so that the prompt plus the expected
+    output always fits in the context window of the model.
+    """
+    def __init__(self, llm: Llama, template, max_output_tokens, max_input_tokens=None, name="LLM"):
+        self.llm = llm
+        self.template = template                    # callable: text -> prompt
+        self.max_output_tokens = max_output_tokens
+        self.max_input_tokens = max_input_tokens    # None = whatever is left in n_ctx
+        self.name = name
+        self.last_stats = {}
+
+    def count_tokens(self, text):
+        return len(self.tokenize(text))
+
+    def tokenize(self, text):
+        return self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=True)
+
+    def input_budget(self, template=None):
+        """Tokens available for the OCR text in this stage."""
+        template = template or self.template
+        available = self.llm.n_ctx() - self.max_output_tokens - self.count_tokens(template(""))
+        if self.max_input_tokens:
+            available = min(available, self.max_input_tokens)
+        return max(available, 0)
+
+    def fit(self, text, budget):
+        """Keeps the start and the end of the text (signatories come last) within budget."""
+        tokens = self.tokenize(text)
+        if len(tokens) <= budget:
+            return text
+        ellipsis_tokens = self.count_tokens(ELLIPSIS)
+        if budget <= ellipsis_tokens:
+            return ""   # Not even the ellipsis fits
+        head_count = max(0, int((budget - ellipsis_tokens) * HEAD_SHARE))
+        tail_count = max(0, budget - ellipsis_tokens - head_count)
+        head = self.llm.detokenize(tokens[:head_count]).decode("utf-8", errors="ignore")
+        tail = self.llm.detokenize(tokens[len(tokens) - tail_count:]).decode("utf-8", errors="ignore") if tail_count else ""
+        return head.rstrip() + ELLIPSIS + tail.lstrip()
+
+    def build(self, ocr_text, template=None):
+        """Returns the prompt for the OCR text, compacted and trimmed to the stage budget."""
+        template = template or self.template
+        budget = self.input_budget(template)
+        compact = compact_ocr_text(ocr_text)
+        fitted = self.fit(compact, budget)
+        prompt = template(fitted)
+
+        raw_tokens = self.count_tokens(ocr_text)
+        final_tokens = self.count_tokens(fitted)
+        self.last_stats = {
+            "raw_tokens": raw_tokens,
+            "compact_tokens": self.count_tokens(compact),
+            "final_tokens": final_tokens,
+            "saved_tokens": raw_tokens - final_tokens,
+            "budget": budget,
+            "truncated": fitted != compact,
+        }
+        print(
+            f"[ MODEL ] {self.name} prompt: OCR text {raw_tokens} -> {final_tokens} tokens "
+            f"(saved {raw_tokens - final_tokens}, budget {budget}"
+            f"{', truncated' if self.last_stats['truncated'] else ''})"
+        )
+        return prompt
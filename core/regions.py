@@ -0,0 +1,153 @@
+import cv2
+import numpy as np
+import os
+import tempfile
+
+class RegionSelector:
+    """
+    Finds the text lines of a certificate page before OCR.
+
+    Characters are joined into line blobs with a morphological gradient and a horizontal
+    closing. Blobs that look like borders (long thin strokes along the page edges) or
+    like seals and logos (large, roughly square) are dropped. Everything outside the
+    kept lines is painted white and the page is cropped to the lines, so the OCR model
+    sees fewer pixels and no ornaments.
+    """
+    def __init__(
+        self,
+        min_line_height=0.004,      # Fractions of the page height/width
+        max_line_height=0.12,
+        edge_margin=0.03,
+        padding=0.01,
+        upright_tolerance=1.0,      # Degrees of skew still considered upright
+        min_orientation_lines=5,    # Lines with ascenders/descenders needed to confirm 0 vs 180 degrees
+        orientation_agreement=0.8,  # Share of those lines that must look upright
+    ):
+        self.min_line_height = min_line_height
+        self.max_line_height = max_line_height
+        self.edge_margin = edge_margin
+        self.padding = padding
+        self.upright_tolerance = upright_tolerance
+        self.min_orientation_lines = min_orientation_lines
+        self.orientation_agreement = orientation_agreement
+
+    def is_ornament(self, x, y, w, h, page_w, page_h):
+        # Border strokes: very long and thin, or hugging the page edges
+        if w > 0.8 * page_w or h > 0.8 * page_h:
+            return True
+        margin_x, margin_y = self.edge_margin * page_w, self.edge_margin * page_h
+        if x < margin_x or y < margin_y or x + w > page_w - margin_x or y + h > page_h - margin_y:
+            return True
+        # Seals and logos: tall, roughly square blobs
+        if h > self.max_line_height * page_h:
+            return True
+        if h > 3 * self.min_line_height * page_h and 0.6 < w / h < 1.6:
+            return True
+        return h < self.min_line_height * page_h
+
+    def find_lines(self, gray):
+        """Returns the bounding boxes (x, y, w, h) of the text lines."""
+        page_h, page_w = gray.shape
+        gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+        _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        # Join the characters of a line (gap of ~1/60 of the page width)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, page_w // 60), 1))
+        connected = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+        contours, _ = cv2.findContours(connected, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        lines = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            if not self.is_ornament(x, y, w, h, page_w, page_h):
+                lines.append((x, y, w, h))
+        return lines, connected
+
+    def skew_angle(self, connected, lines):
+        """Median skew of the kept line blobs in degrees (0 = horizontal)."""
+        angles = []
+        for x, y, w, h in lines:
+            points = cv2.findNonZero(connected[y:y + h, x:x + w])
+            if points is None or w < 3 * h:
+                continue    # Short blobs give unreliable angles
+            (_, _), (rect_w, rect_h), angle = cv2.minAreaRect(points)
+            # Angle of the long side, reduced to (-45, 45] (the range differs between OpenCV versions)
+            if rect_w < rect_h:
+                angle += 90
+            while angle > 45:
+                angle -= 90
+            while angle <= -45:
+                angle += 90
+            angles.append(angle)
+        return float(np.median(angles)) if angles else 0.0
+
+    def reads_upright(self, gray, lines):
+        """
+        0 vs 180 degree check. In Latin text ascenders (b, d, h, k, l, t, capitals) are more
+        common than descenders (g, j, p, q, y), so the dense x-height band of a line sits in
+        its lower part; on an upside-down page it sits in the upper part. All-caps lines have
+        no such asymmetry and do not vote. True only when enough lines agree on upright.
+        """
+        _, ink = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        upright_votes = flipped_votes = 0
+        for x, y, w, h in lines:
+            profile = ink[y:y + h, x:x + w].sum(axis=1)
+            if h < 8 or profile.max() == 0:
+                continue
+            core = np.flatnonzero(profile >= 0.5 * profile.max())
+            above, below = core[0], h - 1 - core[-1]
+            if max(above, below) < 0.15 * h:
+                continue    # No ascender/descender zone (all caps, digits)
+            if above > 1.5 * below:
+                upright_votes += 1
+            elif below > 1.5 * above:
+                flipped_votes += 1
+        votes = upright_votes + flipped_votes
+        return votes >= self.min_orientation_lines and upright_votes >= self.orientation_agreement * votes
+
+    def select(self, image_path):
+        """
+        Writes the cropped, masked page to a new temporary file (the caller deletes it).
+        Returns (path, upright, crop_box, page_size) where crop_box is (x0, y0, x1, y1)
+        in pixels of the original page. upright is only True when the page is not skewed
+        and its text was confirmed not to be upside down. When no text line is found the
+        original image is returned unchanged.
+        """
+        image = cv2.imread(image_path)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        page_h, page_w = gray.shape
+        lines, connected = self.find_lines(gray)
+        if not lines:
+            return image_path, False, (0, 0, page_w, page_h), (page_w, page_h)
+
+        pad_x, pad_y = int(self.padding * page_w), int(self.padding * page_h)
+        masked = np.full_like(image, 255)
+        for x, y, w, h in lines:
+            x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+            x1, y1 = min(page_w, x + w + pad_x), min(page_h, y + h + pad_y)
+            masked[y0:y1, x0:x1] = image[y0:y1, x0:x1]
+
+        crop_x0 = max(0, min(x for x, _, _, _ in lines) - pad_x)
+        crop_y0 = max(0, min(y for _, y, _, _ in lines) - pad_y)
+        crop_x1 = min(page_w, max(x + w for x, _, w, _ in lines) + pad_x)
+        crop_y1 = min(page_h, max(y + h for _, y, _, h in lines) + pad_y)
+        fd, temp_path = tempfile.mkstemp(suffix=".png")
+        os.close(fd)
+        cv2.imwrite(temp_path, masked[crop_y0:crop_y1, crop_x0:crop_x1])
+
+        # Small skew alone does not rule out an upside-down page
+        upright = abs(self.skew_angle(connected, lines)) < self.upright_tolerance and self.reads_upright(gray, lines)
+        kept = sum(w * h for _, _, w, h in lines) / (page_w * page_h)
+        print(f"[ MODEL ] Region selection: {len(lines)} text lines, {kept:.0%} of the page kept, upright={upright}")
+        return temp_path, upright, (crop_x0, crop_y0, crop_x1, crop_y1), (page_w, page_h)
+
+def to_page_boxes(boxes, crop_box, page_size):
+    """Maps 0-1000 boxes of the cropped image back to 0-1000 boxes of the full page."""
+    x0, y0, x1, y1 = crop_box
+    page_w, page_h = page_size
+    crop_w, crop_h = x1 - x0, y1 - y0
+    return [
+        [
+            int((x0 + bx1 * crop_w / 1000) / page_w * 1000), int((y0 + by1 * crop_h / 1000) / page_h * 1000),
+            int((x0 + bx2 * crop_w / 1000) / page_w * 1000), int((y0 + by2 * crop_h / 1000) / page_h * 1000),
+        ]
+        for bx1, by1, bx2, by2 in boxes
+    ]
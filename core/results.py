@@ -0,0 +1,176 @@
+from array import array
+import re
+
+try:
+    import orjson
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:
+    import json
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+CATEGORIES = ["TYPE", "AWARDEE", "ROLE", "EVENT", "DATE", "LOCATION", "SIGNATORIES"]
+UNKNOWN = -1                # Missing offset / box coordinate / confidence
+MIN_MATCH_RATIO = 0.5       # Share of span tokens that must be found in the OCR output
+
+class EntitySpan:
+    """A view of one extracted candidate (label, text, confidence, offsets, box)."""
+    __slots__ = ("label", "text", "confidence", "start", "end", "box")
+
+    def __init__(self, label, text, confidence, start, end, box):
+        self.label = label
+        self.text = text
+        self.confidence = confidence    # Mean OCR confidence of the source words, -1 if unknown
+        self.start = start              # Character offsets in CertificateResult.text, -1 if unknown
+        self.end = end
+        self.box = box                  # (x1, y1, x2, y2) on a 0-1000 scale, None if unknown
+
+    def __repr__(self):
+        return f"EntitySpan({self.label}, {self.text!r}, confidence={self.confidence:.2f})"
+
+class CertificateResult:
+    """
+    Every candidate of every category, stored column-wise: one list of labels and texts,
+    and flat arrays for confidences, character offsets and boxes (4 values per span).
+    """
+    __slots__ = ("text", "image_path", "labels", "texts", "confidences", "offsets", "boxes")
+
+    def __init__(self, text="", image_path=""):
+        self.text = text                    # Cleaned text the offsets refer to
+        self.image_path = image_path
+        self.labels = []
+        self.texts = []
+        self.confidences = array("f")
+        self.offsets = array("i")           # start, end per span
+        self.boxes = array("h")             # x1, y1, x2, y2 per span (0-1000)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def add(self, label, text, confidence=UNKNOWN, start=UNKNOWN, end=UNKNOWN, box=None):
+        self.labels.append(label)
+        self.texts.append(text)
+        self.confidences.append(confidence)
+        self.offsets.extend((start, end))
+        self.boxes.extend(box if box is not None else (UNKNOWN,) * 4)
+
+    def span(self, index):
+        box = tuple(self.boxes[4 * index:4 * index + 4])
+        return EntitySpan(
+            self.labels[index],
+            self.texts[index],
+            self.confidences[index],
+            self.offsets[2 * index],
+            self.offsets[2 * index + 1],
+            None if box[0] == UNKNOWN else box,
+        )
+
+    def copy(self, image_path=None):
+        """A copy of the result, optionally for another image."""
+        result = CertificateResult(self.text, self.image_path if image_path is None else image_path)
+        result.labels = list(self.labels)
+        result.texts = list(self.texts)
+        result.confidences = array("f", self.confidences)
+        result.offsets = array("i", self.offsets)
+        result.boxes = array("h", self.boxes)
+        return result
+
+    def candidates(self, label):
+        """All candidates of a category, in extraction order."""
+        return [self.span(i) for i, name in enumerate(self.labels) if name == label]
+
+    def to_legacy_dict(self):
+        """The flat response of /process_ocr: first candidate per category, SIGNATORIES joined."""
+        results = {}
+        for category in CATEGORIES:
+            texts = [span.text for span in self.candidates(category)]
+            if category == "SIGNATORIES":
+                results[category] = ", ".join(texts)
+            else:
+                results[category] = texts[0] if texts else ""
+        results["IMAGE_PATH"] = self.image_path
+        return results
+
+    def to_compact(self):
+        """Column-oriented dict, cheap to serialize (no per-span objects)."""
+        return {
+            "text": self.text,
+            "image_path": self.image_path,
+            "labels": self.labels,
+            "texts": self.texts,
+            "confidences": [round(value, 3) for value in self.confidences],
+            "offsets": self.offsets.tolist(),
+            "boxes": self.boxes.tolist(),
+        }
+
+    def serialize(self) -> bytes:
+        return dumps(self.to_compact())
+
+def normalize_tokens(text):
+    return [token for token in re.split(r"\W+", text.lower()) if token]
+
+def locate(span_text, words, boxes, scores):
+    """
+    Finds the OCR fragments a span was read from.
+    Returns (box, confidence): the union of the fragment boxes and their mean confidence,
+    or (None, UNKNOWN) if less than half of the span tokens are found in order.
+    """
+    span_tokens = normalize_tokens(span_text)
+    if not span_tokens or not words:
+        return None, UNKNOWN
+    # Token stream of the OCR output, remembering which fragment each token came from
+    stream, owners = [], []
+    for index, word in enumerate(words):
+        for token in normalize_tokens(word):
+            stream.append(token)
+            owners.append(index)
+
+    best_matches, best_fragments = 0, None
+    for start in range(len(stream)):
+        if stream[start] not in span_tokens:
+            continue
+        # Greedily match the span tokens in order, allowing skipped OCR tokens
+        matches, position, fragments = 0, start, set()
+        for token in span_tokens:
+            window = stream[position:position + 3]
+            if token in window:
+                offset = window.index(token)
+                fragments.add(owners[position + offset])
+                position += offset + 1
+                matches += 1
+        if matches > best_matches:
+            best_matches, best_fragments = matches, fragments
+            if matches == len(span_tokens):
+                break
+
+    if best_fragments is None or best_matches / len(span_tokens) < MIN_MATCH_RATIO:
+        return None, UNKNOWN
+    selected = sorted(best_fragments)
+    box = (
+        min(boxes[i][0] for i in selected),
+        min(boxes[i][1] for i in selected),
+        max(boxes[i][2] for i in selected),
+        max(boxes[i][3] for i in selected),
+    )
+    known = [scores[i] for i in selected if scores[i] != UNKNOWN]
+    confidence = sum(known) / len(known) if known else UNKNOWN
+    return box, confidence
+
+def find_offsets(text, span_text, start_from=0):
+    """Case-insensitive character offsets of span_text in text, (-1, -1) if absent."""
+    start = text.lower().find(span_text.lower(), start_from)
+    if start < 0:
+        return UNKNOWN, UNKNOWN
+    return start, start + len(span_text)
+
+def spans_from_prediction(text, prediction, labels=CATEGORIES):
+    """Turns a KIE prediction ({label: value or [values]}) into (label, text, start, end) spans."""
+    spans = []
+    for label in labels:
+        values = prediction.get(label, [])
+        for value in values if isinstance(values, list) else [values]:
+            value = str(value)
+            start, end = find_offsets(text, value)
+            spans.append((label, value, start, end))
+    return spans
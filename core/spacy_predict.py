@@ -16,4 +16,9 @@ class NERPredictor:
             if(ent.label_ not in entities):
                 entities[ent.label_] = []
             entities[ent.label_].append(ent.text)
-        return entities
\ No newline at end of file
+        return entities
+
+    def predict_spans(self, text):
+        """Returns (label, text, start_char, end_char) for every entity."""
+        doc = self.nlp(text)
+        return [(ent.label_, ent.text, ent.start_char, ent.end_char) for ent in doc.ents]
\ No newline at end of file
@@ -0,0 +1,240 @@
+from core.results import CATEGORIES
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+import hashlib
+import json
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+MAX_PAGE_SIZE = 200
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS certificates (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    source TEXT NOT NULL,               -- local | gemini
+    file_name TEXT,
+    image_sha256 TEXT,
+    image_path TEXT,
+    type TEXT,
+    awardee TEXT,
+    role TEXT,
+    event TEXT,
+    date TEXT,
+    location TEXT,
+    signatories TEXT,                   -- ", "-joined, as in the /process_ocr response
+    awardee_key TEXT,                   -- Normalized values for exact lookups
+    event_key TEXT,
+    date_key TEXT,
+    result BLOB                         -- Compact JSON of every candidate (local pipeline only)
+);
+CREATE INDEX IF NOT EXISTS idx_certificates_awardee ON certificates(awardee_key, id);
+CREATE INDEX IF NOT EXISTS idx_certificates_event ON certificates(event_key, id);
+CREATE INDEX IF NOT EXISTS idx_certificates_date ON certificates(date_key, id);
+CREATE INDEX IF NOT EXISTS idx_certificates_sha ON certificates(image_sha256);
+
+CREATE TABLE IF NOT EXISTS certificate_signatories (
+    name_key TEXT NOT NULL,
+    certificate_id INTEGER NOT NULL,
+    PRIMARY KEY (name_key, certificate_id)
+) WITHOUT ROWID;
+
+-- Full-text index over the extracted fields, kept in sync with the table by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS certificates_fts USING fts5(
+    type, awardee, event, date, location, signatories,
+    content='certificates', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS certificates_ai AFTER INSERT ON certificates BEGIN
+    INSERT INTO certificates_fts(rowid, type, awardee, event, date, location, signatories)
+    VALUES (new.id, new.type, new.awardee, new.event, new.date, new.location, new.signatories);
+END;
+CREATE TRIGGER IF NOT EXISTS certificates_ad AFTER DELETE ON certificates BEGIN
+    INSERT INTO certificates_fts(certificates_fts, rowid, type, awardee, event, date, location, signatories)
+    VALUES ('delete', old.id, old.type, old.awardee, old.event, old.date, old.location, old.signatories);
+    DELETE FROM certificate_signatories WHERE certificate_id = old.id;
+END;
+CREATE TRIGGER IF NOT EXISTS certificates_au AFTER UPDATE ON certificates BEGIN
+    INSERT INTO certificates_fts(certificates_fts, rowid, type, awardee, event, date, location, signatories)
+    VALUES ('delete', old.id, old.type, old.awardee, old.event, old.date, old.location, old.signatories);
+    INSERT INTO certificates_fts(rowid, type, awardee, event, date, location, signatories)
+    VALUES (new.id, new.type, new.awardee, new.event, new.date, new.location, new.signatories);
+END;
+"""
+
+INSERT_CERTIFICATE = """
+INSERT INTO certificates (created_at, source, file_name, image_sha256, image_path, type, awardee, role,
+                          event, date, location, signatories, awardee_key, event_key, date_key, result)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+SUMMARY_COLUMNS = "c.id, c.created_at, c.source, c.file_name, c.image_path, c.type, c.awardee, c.role, c.event, c.date, c.location, c.signatories"
+
+def normalize(value):
+    """Lookup key of a field: lower case, single spaces, no surrounding punctuation."""
+    return re.sub(r"\s+", " ", str(value or "")).strip(" .,;:").lower()
+
+def fts_query(text):
+    """Quotes every term so user input cannot break the FTS5 query syntax."""
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+def connect(path):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")       # Readers never wait for the writer
+    connection.execute("PRAGMA synchronous=NORMAL")     # Safe against process crashes, fsync only at checkpoints
+    connection.execute("PRAGMA busy_timeout=30000")     # Workers share the file
+    return connection
+
+class ResultStore:
+    """
+    Keeps every extraction in SQLite. Requests only enqueue their record; a background
+    thread writes the queue in batched transactions (up to batch_size records or
+    flush_interval seconds). Uploaded images are kept by content hash so that the
+    stored image path stays valid.
+    """
+    def __init__(self, db_path="results.db", image_dir="stored_images", batch_size=100, flush_interval=0.2):
+        self.db_path = str(db_path)
+        self.image_dir = Path(image_dir)
+        self.image_dir.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        with closing(connect(self.db_path)) as connection:
+            connection.executescript(SCHEMA)
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, name="result-store-writer", daemon=True)
+        self.writer.start()
+
+    def save_image(self, image_bytes, filename):
+        """Copies an upload to image_dir/<sha[:2]>/<sha><ext> once. Returns (sha256, path)."""
+        sha = hashlib.sha256(image_bytes).hexdigest()
+        path = self.image_dir / sha[:2] / (sha + Path(filename or "").suffix.lower())
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            temp_path = path.with_suffix(path.suffix + ".tmp")
+            temp_path.write_bytes(image_bytes)
+            temp_path.replace(path)
+        return sha, str(path)
+
+    def add(self, source, fields, file_name="", image_sha256=None, image_path=None, result=None):
+        """
+        Queues one extraction. fields holds the flat CATEGORIES values, SIGNATORIES as a list
+        of names; result is the CertificateResult of the local pipeline.
+        """
+        signatories = [name for name in fields.get("SIGNATORIES") or [] if name]
+        values = {category: fields.get(category) or "" for category in CATEGORIES if category != "SIGNATORIES"}
+        row = (
+            datetime.now(timezone.utc).isoformat(timespec="seconds"), source, file_name, image_sha256, image_path,
+            values["TYPE"], values["AWARDEE"], values["ROLE"], values["EVENT"], values["DATE"], values["LOCATION"],
+            ", ".join(signatories),
+            normalize(values["AWARDEE"]), normalize(values["EVENT"]), normalize(values["DATE"]),
+            result.serialize() if result is not None else None,
+        )
+        self.pending.put((row, [normalize(name) for name in signatories]))
+
+    def write_loop(self):
+        connection = connect(self.db_path)
+        running = True
+        while running:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.pending.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            if None in batch:   # close() was called: write what came before and stop
+                running = False
+                batch = [record for record in batch if record is not None]
+            if batch:
+                self.write_safely(connection, batch)
+            for _ in range(len(batch) + (0 if running else 1)):
+                self.pending.task_done()
+        connection.close()
+
+    def write_safely(self, connection, batch):
+        """
+        Writes a batch without ever stopping the writer thread. If the batch transaction
+        fails, its records are retried one by one so only the faulty ones are lost.
+        """
+        try:
+            self.write_batch(connection, batch)
+            return
+        except Exception as e:
+            print(f"[ STORE ] Failed to write a batch of {len(batch)} result(s), retrying one by one: {e}")
+        for record in batch:
+            try:
+                self.write_batch(connection, [record])
+            except Exception as e:
+                print(f"[ STORE ] Dropped a result that could not be written: {e}")
+
+    def write_batch(self, connection, batch):
+        """Writes a batch of records in a single transaction."""
+        with connection:
+            signatory_rows = []
+            for row, names in batch:
+                certificate_id = connection.execute(INSERT_CERTIFICATE, row).lastrowid
+                signatory_rows.extend((name, certificate_id) for name in set(names) if name)
+            connection.executemany(
+                "INSERT OR IGNORE INTO certificate_signatories (name_key, certificate_id) VALUES (?, ?)",
+                signatory_rows
+            )
+        print(f"[ STORE ] Wrote {len(batch)} result(s)")
+
+    def flush(self):
+        """Blocks until every queued record is written."""
+        self.pending.join()
+
+    def close(self):
+        self.pending.put(None)
+        self.writer.join()
+
+    def search(self, awardee=None, event=None, date=None, signatory=None, q=None, limit=50, cursor=None):
+        """
+        Newest first, keyset-paginated on id: pass the returned next_cursor to get the next page.
+        awardee, event, date and signatory match whole (normalized) values through their
+        indexes; q is a full-text query over every field.
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        if q:
+            query = f"SELECT {SUMMARY_COLUMNS} FROM certificates_fts f JOIN certificates c ON c.id = f.rowid WHERE certificates_fts MATCH ?"
+            params = [fts_query(q)]
+            # FTS5 walks its rowids in order and applies rowid bounds itself; going through
+            # c.id would collect every match and sort it on each page
+            key = "f.rowid"
+        else:
+            query = f"SELECT {SUMMARY_COLUMNS} FROM certificates c WHERE 1 = 1"
+            params = []
+            key = "c.id"
+        for column, value in (("awardee_key", awardee), ("event_key", event), ("date_key", date)):
+            if value:
+                query += f" AND c.{column} = ?"
+                params.append(normalize(value))
+        if signatory:
+            query += " AND c.id IN (SELECT certificate_id FROM certificate_signatories WHERE name_key = ?)"
+            params.append(normalize(signatory))
+        if cursor is not None:
+            query += f" AND {key} < ?"
+            params.append(cursor)
+        query += f" ORDER BY {key} DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with closing(connect(self.db_path)) as connection:
+            rows = [dict(row) for row in connection.execute(query, params)]
+        next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+        return {"items": rows[:limit], "next_cursor": next_cursor}
+
+    def get(self, certificate_id):
+        """The full record, with every candidate of the local pipeline. None if it does not exist."""
+        with closing(connect(self.db_path)) as connection:
+            row = connection.execute("SELECT * FROM certificates WHERE id = ?", (certificate_id,)).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        for key in ("awardee_key", "event_key", "date_key"):
+            record.pop(key)
+        record["result"] = json.loads(record["result"]) if record["result"] else None
+        return record
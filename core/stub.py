@@ -0,0 +1,39 @@
+from core.results import CertificateResult
+import time
+
+STUB_TEXT = "CERTIFICATE OF PARTICIPATION\nis awarded to\nJuan Dela Cruz\nfor attending the LiDAR Training\nMay 5, 2023\nUP Diliman, Quezon City\nDr. Ana Santos\nProject Leader"
+
+# (label, text) of the canned extraction, located in STUB_TEXT
+STUB_SPANS = [
+    ("TYPE", "CERTIFICATE OF PARTICIPATION"),
+    ("AWARDEE", "Juan Dela Cruz"),
+    ("EVENT", "LiDAR Training"),
+    ("DATE", "May 5, 2023"),
+    ("LOCATION", "UP Diliman, Quezon City"),
+    ("SIGNATORIES", "Dr. Ana Santos"),
+]
+
+class StubArchitecture:
+    """
+    Stands in for CertificateArchitecture in load tests (MODEL_BACKEND = stub): no model is
+    loaded, every prediction blocks for latency_ms like the CPU-bound pipeline does and
+    returns a canned result.
+    """
+    def __init__(self, latency_ms=500):
+        self.latency_ms = latency_ms
+
+    def predict(self, image_path):
+        return self.predict_result(image_path).to_legacy_dict()
+
+    def predict_result(self, image_path) -> CertificateResult:
+        time.sleep(self.latency_ms / 1000)
+        result = CertificateResult(STUB_TEXT, image_path)
+        for label, text in STUB_SPANS:
+            start = STUB_TEXT.index(text)
+            result.add(label, text, 0.99, start, start + len(text))
+        return result
+
+    def predict_from_template(self, image_path, template: CertificateResult):
+        # Only the awardee band is read again in the real pipeline
+        time.sleep(self.latency_ms / 4000)
+        return template.copy(image_path)
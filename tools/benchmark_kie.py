@@ -0,0 +1,96 @@
+# Benchmark speculative decoding for the Qwen2.5-7B KIE model.
+# Usage: python tools/benchmark_kie.py <ocr_text_folder> [--draft-tokens N] [--threads N] [--cascade]
+#
+# Every .txt file in the folder holds the OCR text of one certificate. Each mode runs
+# with greedy sampling, and its extractions are compared against the "off" run.
+# --cascade instead compares the full extraction with the spaCy-first cascade extractor.
+import argparse
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.llm_engine import load_llama, make_draft_model
+from core.llm_kie import LLMKIEPredictor
+from core.cascade import CascadeExtractor
+from core.spacy_predict import NERPredictor
+from core import llm_post
+
+MODES = ["off", "ngram", "draft"]
+
+def run_mode(mode, texts, draft_tokens, threads, draft_llm):
+    """Runs the KIE predictor over all texts and returns (outputs, completion tokens, seconds)."""
+    predictor = LLMKIEPredictor(
+        n_threads=threads,
+        draft_model=make_draft_model(mode, num_pred_tokens=draft_tokens, draft_llm=draft_llm),
+        temperature=0.0,
+    )
+    outputs, tokens, seconds = [], 0, 0.0
+    for text in texts:
+        start = time.perf_counter()
+        outputs.append(predictor.predict(text))
+        seconds += time.perf_counter() - start
+        tokens += predictor.last_completion_tokens
+    del predictor
+    gc.collect()
+    return outputs, tokens, seconds
+
+def run_cascade(texts, threads):
+    """Compares output tokens and latency of the full KIE extraction and the cascade."""
+    predictor = LLMKIEPredictor(n_threads=threads, temperature=0.0)
+    tokens, seconds = 0, 0.0
+    for text in texts:
+        start = time.perf_counter()
+        predictor.predict(text)
+        seconds += time.perf_counter() - start
+        tokens += predictor.last_completion_tokens
+    cascade = CascadeExtractor(NERPredictor(), predictor)
+    for text in texts:
+        cascade.predict_spans(text)
+    report = cascade.report()
+
+    count = len(texts)
+    print()
+    print(f"{'extractor':<10}{'tokens/cert':>14}{'seconds/cert':>14}{'LLM calls':>12}")
+    print(f"{'full':<10}{tokens / count:>14.1f}{seconds / count:>14.3f}{1.0:>12.0%}")
+    print(f"{'cascade':<10}{report['avg_completion_tokens']:>14.1f}{report['avg_seconds']:>14.3f}{report['llm_call_rate']:>12.0%}")
+    print(f"Fields requested from the LLM per certificate: {report['avg_fields_requested']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="KIE speculative decoding benchmark")
+    parser.add_argument("folder", help="Folder with OCR text files (.txt)")
+    parser.add_argument("--draft-tokens", type=int, default=10, help="Tokens drafted per step")
+    parser.add_argument("--threads", type=int, default=None, help="llama.cpp threads")
+    parser.add_argument("--cascade", action="store_true", help="Compare full extraction with the cascade")
+    args = parser.parse_args()
+
+    texts = []
+    for name in sorted(os.listdir(args.folder)):
+        if name.endswith(".txt"):
+            with open(os.path.join(args.folder, name), "r", encoding="utf-8") as f:
+                texts.append(f.read())
+    if not texts:
+        print(f"No .txt files found in {args.folder}")
+        return
+
+    if args.cascade:
+        run_cascade(texts, args.threads)
+        return
+
+    draft_llm = load_llama(llm_post.REPO_ID, llm_post.FILENAME, n_ctx=llm_post.N_CTX, n_threads=args.threads)
+    results = {}
+    for mode in MODES:
+        print(f"[ BENCH ] Running speculative={mode} on {len(texts)} texts...")
+        results[mode] = run_mode(mode, texts, args.draft_tokens, args.threads, draft_llm)
+
+    baseline_outputs, _, baseline_seconds = results["off"]
+    print()
+    print(f"{'mode':<10}{'seconds':>10}{'tok/s':>10}{'speedup':>10}{'identical':>12}")
+    for mode, (outputs, tokens, seconds) in results.items():
+        identical = sum(out == ref for out, ref in zip(outputs, baseline_outputs))
+        print(f"{mode:<10}{seconds:>10.2f}{tokens / seconds:>10.1f}{baseline_seconds / seconds:>9.2f}x{identical:>8}/{len(texts)}")
+
+if __name__ == "__main__":
+    main()
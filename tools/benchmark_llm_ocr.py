@@ -0,0 +1,67 @@
+# Benchmark the Florence-2 OCR profiles on a folder of certificate images.
+# Usage: python tools/benchmark_llm_ocr.py <image_folder> [--threads N]
+#
+# Reports the mean latency of every variant/profile combination and the text
+# similarity of its output against the most accurate setting (large/accuracy).
+import argparse
+import gc
+import os
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.llm_ocr import LLMOCRWrapper, MODEL_VARIANTS, PROFILES
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+REFERENCE = ("large", "accuracy")
+
+def run_setting(variant, profile, images, threads):
+    """Runs one variant/profile over all images and returns (outputs, latencies)."""
+    ocr = LLMOCRWrapper(variant=variant, profile=profile, num_threads=threads)
+    outputs, latencies = [], []
+    for image_path in images:
+        start = time.perf_counter()
+        outputs.append(ocr.predict(image_path))
+        latencies.append(time.perf_counter() - start)
+    del ocr
+    gc.collect()
+    return outputs, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Florence-2 OCR profile benchmark")
+    parser.add_argument("folder", help="Folder with certificate images")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads")
+    args = parser.parse_args()
+
+    images = sorted(
+        os.path.join(args.folder, name) for name in os.listdir(args.folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not images:
+        print(f"No images found in {args.folder}")
+        return
+
+    settings = [REFERENCE] + [
+        (variant, profile) for variant in MODEL_VARIANTS for profile in PROFILES
+        if (variant, profile) != REFERENCE
+    ]
+    results = {}
+    for variant, profile in settings:
+        print(f"[ BENCH ] Running {variant}/{profile} on {len(images)} images...")
+        results[(variant, profile)] = run_setting(variant, profile, images, args.threads)
+
+    reference_outputs, reference_latencies = results[REFERENCE]
+    reference_mean = sum(reference_latencies) / len(reference_latencies)
+    print()
+    print(f"{'setting':<20}{'mean latency (s)':>18}{'speedup':>10}{'similarity':>12}")
+    for (variant, profile), (outputs, latencies) in results.items():
+        mean_latency = sum(latencies) / len(latencies)
+        similarity = sum(
+            SequenceMatcher(None, ref, out).ratio() for ref, out in zip(reference_outputs, outputs)
+        ) / len(outputs)
+        print(f"{variant + '/' + profile:<20}{mean_latency:>18.2f}{reference_mean / mean_latency:>9.2f}x{similarity:>12.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Benchmark region-of-interest selection before OCR.
+# Usage: python tools/benchmark_roi.py <image_folder> [--ocr paddle|doctr]
+#
+# Runs the OCR model on every image of the folder on the full page and on the selected
+# text regions, and reports the OCR time per certificate and the text similarity.
+import argparse
+import os
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.regions import RegionSelector
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+def load_ocr(name):
+    if name == "doctr":
+        from core.doctr_ocr import DoctrOCRWrapper
+        return DoctrOCRWrapper()
+    from core.paddle_ocr import PaddleOCRWrapper
+    return PaddleOCRWrapper()
+
+def run_ocr(ocr, name, image_path, upright=False):
+    if name == "paddle":
+        return ocr.predict_words(image_path, upright=upright)[0]
+    return ocr.predict_words(image_path)[0]
+
+def main():
+    parser = argparse.ArgumentParser(description="Region selection OCR benchmark")
+    parser.add_argument("folder", help="Folder with certificate images")
+    parser.add_argument("--ocr", choices=["paddle", "doctr"], default="paddle")
+    args = parser.parse_args()
+
+    images = sorted(
+        os.path.join(args.folder, name) for name in os.listdir(args.folder)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not images:
+        print(f"No images found in {args.folder}")
+        return
+
+    ocr = load_ocr(args.ocr)
+    selector = RegionSelector()
+    # Warm-up so that model initialization is not counted
+    run_ocr(ocr, args.ocr, images[0])
+
+    full_times, roi_times, selection_times, similarities = [], [], [], []
+    for image_path in images:
+        start = time.perf_counter()
+        full_text = run_ocr(ocr, args.ocr, image_path)
+        full_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        region_path, upright, _, _ = selector.select(image_path)
+        selection_times.append(time.perf_counter() - start)
+        roi_text = run_ocr(ocr, args.ocr, region_path, upright)
+        roi_times.append(time.perf_counter() - start)
+        if region_path != image_path:
+            os.remove(region_path)
+        similarities.append(SequenceMatcher(None, full_text, roi_text).ratio())
+
+    count = len(images)
+    full_mean = sum(full_times) / count
+    roi_mean = sum(roi_times) / count
+    print()
+    print(f"Certificates:                 {count}")
+    print(f"OCR full page (s/cert):       {full_mean:.2f}")
+    print(f"OCR with regions (s/cert):    {roi_mean:.2f} (selection {sum(selection_times) / count:.3f})")
+    print(f"Saved per certificate:        {full_mean - roi_mean:.2f}s ({1 - roi_mean / full_mean:.0%})")
+    print(f"Text similarity to full page: {sum(similarities) / count:.3f}")
+
+if __name__ == "__main__":
+    main()
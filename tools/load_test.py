@@ -0,0 +1,278 @@
+# Load test for the HTTP API.
+# Usage:
+#   python tools/load_test.py run <image_folder> [--url URL] [--endpoint process_ocr|process_gemini|mixed]
+#                             [--rate R] [--concurrency N] [--requests N | --duration S] [--timeout S]
+#                             [--slo-p95 MS] [--json report.json]
+#   python tools/load_test.py gemini-mock [--port 8001] [--latency-ms 800] [--error-rate 0.0]
+#
+# "run" replays the images of the folder against a running server. With --rate the arrivals
+# are open-loop (Poisson, R requests/s, whatever the server's speed); with --rate 0 every
+# one of the --concurrency clients sends its next request as soon as the previous one ends.
+# Latency is measured from the scheduled arrival, so time spent waiting for a free client
+# slot is included. The server reports its handling time in the Server-Timing header, and
+# the rest of the server-side time is reported as queueing delay.
+#
+# For a run without models or network, start the server with MODEL_BACKEND = stub, and
+# GEMINI_API = test and GEMINI_BASE_URL = http://127.0.0.1:8001 pointing at "gemini-mock".
+import argparse
+import asyncio
+import json
+import mimetypes
+import os
+import random
+import re
+import sys
+import time
+
+import httpx
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp")
+
+# Endpoint -> name of its upload field
+ENDPOINTS = {
+    "process_ocr": "image_file",
+    "process_gemini": "file",
+}
+
+MOCK_DOCUMENT = {
+    "TYPE": "Certificate of Participation",
+    "AWARDEE": "Juan Dela Cruz",
+    "ROLE": "Participant",
+    "EVENT": "LiDAR Training",
+    "DATE": "May 5, 2023",
+    "LOCATION": "UP Diliman, Quezon City",
+    "SIGNATORIES": ["Dr. Ana Santos"],
+}
+
+def load_corpus(folder):
+    """Returns (name, bytes, mime type) for every image of the folder."""
+    corpus = []
+    for name in sorted(os.listdir(folder)):
+        if name.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(folder, name), "rb") as f:
+                corpus.append((name, f.read(), mimetypes.guess_type(name)[0] or "application/octet-stream"))
+    return corpus
+
+def server_time(response):
+    """Handling time reported in the Server-Timing header, in seconds (None if absent)."""
+    match = re.search(r"app;dur=([\d.]+)", response.headers.get("Server-Timing", ""))
+    return float(match.group(1)) / 1000 if match else None
+
+def percentile(values, share):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(share * len(ordered))) - 1))]
+
+class LoadTest:
+    def __init__(self, args, corpus):
+        self.args = args
+        self.corpus = corpus
+        self.random = random.Random(args.seed)
+        self.slots = asyncio.Semaphore(args.concurrency)
+        self.records = []
+
+    def pick_endpoint(self):
+        if self.args.endpoint == "mixed":
+            return "process_gemini" if self.random.random() < self.args.gemini_share else "process_ocr"
+        return self.args.endpoint
+
+    async def send(self, client, index, scheduled):
+        """Sends one upload and records its outcome."""
+        endpoint = self.pick_endpoint()
+        name, data, mime = self.corpus[index % len(self.corpus)]
+        record = {"endpoint": endpoint, "status": None, "outcome": "ok",
+                  "latency": None, "client_wait": None, "server_time": None, "queueing": None}
+        async with self.slots:
+            started = time.perf_counter()
+            record["client_wait"] = started - scheduled
+            try:
+                response = await client.post(
+                    f"{self.args.url}/{endpoint}",
+                    files={ENDPOINTS[endpoint]: (name, data, mime)},
+                    timeout=self.args.timeout,
+                )
+                finished = time.perf_counter()
+                record["status"] = response.status_code
+                record["latency"] = finished - scheduled
+                record["server_time"] = server_time(response)
+                if record["server_time"] is not None:
+                    record["queueing"] = max(0.0, finished - started - record["server_time"])
+                if response.status_code >= 400:
+                    record["outcome"] = "error"
+            except httpx.TimeoutException:
+                record["outcome"] = "timeout"
+            except httpx.HTTPError as e:
+                record["outcome"] = "error"
+                record["status"] = type(e).__name__
+        self.records.append(record)
+
+    def should_stop(self, sent, start):
+        if self.args.duration:
+            return time.perf_counter() - start >= self.args.duration
+        return sent >= self.args.requests
+
+    async def open_loop(self, client, start):
+        """Poisson arrivals at --rate requests/s, independent of the response times."""
+        tasks, sent, arrival = [], 0, start
+        while not self.should_stop(sent, start):
+            arrival += self.random.expovariate(self.args.rate)
+            await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+            tasks.append(asyncio.create_task(self.send(client, sent, arrival)))
+            sent += 1
+        await asyncio.gather(*tasks)
+
+    async def closed_loop(self, client, start):
+        """--concurrency clients, each sending its next request when the previous one ends."""
+        counter = iter(range(sys.maxsize))
+        async def client_loop():
+            while True:
+                index = next(counter)
+                if self.should_stop(index, start):
+                    return
+                await self.send(client, index, time.perf_counter())
+        await asyncio.gather(*(client_loop() for _ in range(self.args.concurrency)))
+
+    async def run(self):
+        limits = httpx.Limits(max_connections=self.args.concurrency, max_keepalive_connections=self.args.concurrency)
+        async with httpx.AsyncClient(limits=limits) as client:
+            start = time.perf_counter()
+            if self.args.rate > 0:
+                await self.open_loop(client, start)
+            else:
+                await self.closed_loop(client, start)
+            return time.perf_counter() - start
+
+def summarize(records, elapsed):
+    """Throughput, latency percentiles, error/timeout rates and queueing delay of a set of requests."""
+    ok = [r for r in records if r["outcome"] == "ok"]
+    sent = len(records) or 1
+    def ms(values, share):
+        value = percentile(values, share)
+        return round(value * 1000, 1) if value is not None else None
+    latencies = [r["latency"] for r in ok]
+    queueing = [r["queueing"] for r in ok if r["queueing"] is not None]
+    client_wait = [r["client_wait"] for r in records]
+    server = [r["server_time"] for r in ok if r["server_time"] is not None]
+    return {
+        "sent": len(records),
+        "ok": len(ok),
+        "errors": sum(r["outcome"] == "error" for r in records),
+        "timeouts": sum(r["outcome"] == "timeout" for r in records),
+        "error_rate": round(sum(r["outcome"] == "error" for r in records) / sent, 4),
+        "timeout_rate": round(sum(r["outcome"] == "timeout" for r in records) / sent, 4),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else None,
+        "latency_ms": {"p50": ms(latencies, 0.50), "p95": ms(latencies, 0.95), "p99": ms(latencies, 0.99)},
+        "server_time_ms": {"p50": ms(server, 0.50), "p95": ms(server, 0.95), "p99": ms(server, 0.99)},
+        "queueing_ms": {"p50": ms(queueing, 0.50), "p95": ms(queueing, 0.95), "p99": ms(queueing, 0.99)},
+        "client_wait_ms": {"p50": ms(client_wait, 0.50), "p95": ms(client_wait, 0.95), "p99": ms(client_wait, 0.99)},
+        "status_codes": {str(code): sum(r["status"] == code for r in records) for code in {r["status"] for r in records}},
+    }
+
+def print_report(report):
+    print()
+    print(f"{'endpoint':<16}{'sent':>6}{'ok':>6}{'err%':>7}{'tmo%':>7}{'req/s':>8}"
+          f"{'p50':>9}{'p95':>9}{'p99':>9}{'queue p50':>11}{'queue p95':>11}{'queue p99':>11}")
+    for name, summary in report["endpoints"].items():
+        latency, queueing = summary["latency_ms"], summary["queueing_ms"]
+        print(f"{name:<16}{summary['sent']:>6}{summary['ok']:>6}{summary['error_rate']:>7.1%}{summary['timeout_rate']:>7.1%}"
+              f"{summary['throughput_rps'] or 0:>8.2f}"
+              f"{latency['p50'] or 0:>9.1f}{latency['p95'] or 0:>9.1f}{latency['p99'] or 0:>9.1f}"
+              f"{queueing['p50'] or 0:>11.1f}{queueing['p95'] or 0:>11.1f}{queueing['p99'] or 0:>11.1f}")
+    print("Latencies in ms, from the scheduled arrival. Queueing = server-side time before the request was handled.")
+    total = report["endpoints"]["total"]
+    print(f"Client-side wait for a free slot (ms): p50 {total['client_wait_ms']['p50']}, p95 {total['client_wait_ms']['p95']}")
+    print(f"Status codes: {total['status_codes']}")
+
+def run(args):
+    corpus = load_corpus(args.folder)
+    if not corpus:
+        print(f"No images found in {args.folder}")
+        sys.exit(2)
+    args.url = args.url.rstrip("/")
+    mode = f"open loop, {args.rate} req/s" if args.rate > 0 else "closed loop"
+    amount = f"{args.duration}s" if args.duration else f"{args.requests} requests"
+    print(f"[ LOAD ] {args.endpoint} against {args.url}: {mode}, concurrency {args.concurrency}, {amount}, {len(corpus)} images")
+
+    test = LoadTest(args, corpus)
+    elapsed = asyncio.run(test.run())
+    endpoints = sorted({r["endpoint"] for r in test.records})
+    report = {
+        "config": {key: value for key, value in vars(args).items() if key != "func"},
+        "elapsed_s": round(elapsed, 2),
+        "endpoints": {name: summarize([r for r in test.records if r["endpoint"] == name], elapsed) for name in endpoints},
+    }
+    report["endpoints"]["total"] = summarize(test.records, elapsed)
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[ LOAD ] Report written to {args.json}")
+    if args.slo_p95:
+        p95 = report["endpoints"]["total"]["latency_ms"]["p95"]
+        failed_share = 1 - report["endpoints"]["total"]["ok"] / max(1, report["endpoints"]["total"]["sent"])
+        passed = p95 is not None and p95 <= args.slo_p95 and failed_share <= args.slo_error_rate
+        print(f"[ LOAD ] SLO p95 <= {args.slo_p95} ms and failures <= {args.slo_error_rate:.1%}: {'PASS' if passed else 'FAIL'}")
+        sys.exit(0 if passed else 1)
+
+def gemini_mock(args):
+    """Serves generateContent like the Gemini API, with a fixed latency and an optional error rate."""
+    from fastapi import FastAPI
+    from fastapi.responses import JSONResponse
+    import uvicorn
+
+    mock = FastAPI()
+    rng = random.Random(args.seed)
+
+    @mock.post("/{version}/models/{model}:generateContent")
+    async def generate_content(version: str, model: str):
+        await asyncio.sleep(args.latency_ms / 1000)    # A remote call does not block the server
+        if rng.random() < args.error_rate:
+            return JSONResponse(status_code=503, content={
+                "error": {"code": 503, "message": "The model is overloaded.", "status": "UNAVAILABLE"}
+            })
+        text = json.dumps(MOCK_DOCUMENT)
+        return {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}],
+            "usageMetadata": {"promptTokenCount": 300, "candidatesTokenCount": 60, "totalTokenCount": 360},
+            "modelVersion": model,
+        }
+
+    print(f"[ LOAD ] Gemini mock on http://{args.host}:{args.port} ({args.latency_ms} ms, {args.error_rate:.0%} errors)")
+    uvicorn.run(mock, host=args.host, port=args.port, log_level="warning")
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API load test")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="Replay a folder of certificates against a running server")
+    run_parser.add_argument("folder", help="Folder with certificate images")
+    run_parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server base URL")
+    run_parser.add_argument("--endpoint", default="process_ocr", choices=[*ENDPOINTS, "mixed"])
+    run_parser.add_argument("--gemini-share", type=float, default=0.5, help="Share of /process_gemini requests with --endpoint mixed")
+    run_parser.add_argument("--rate", type=float, default=0.0, help="Arrivals per second (Poisson); 0 = closed loop")
+    run_parser.add_argument("--concurrency", type=int, default=4, help="Max requests in flight")
+    run_parser.add_argument("--requests", type=int, default=100, help="Requests to send")
+    run_parser.add_argument("--duration", type=float, default=0.0, help="Send for this many seconds instead")
+    run_parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds")
+    run_parser.add_argument("--slo-p95", type=float, default=0.0, help="Fail (exit 1) if the p95 latency exceeds this many ms")
+    run_parser.add_argument("--slo-error-rate", type=float, default=0.01, help="Max share of errors and timeouts for the SLO")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--json", help="Write the report to this file")
+    run_parser.set_defaults(func=run)
+
+    mock_parser = commands.add_parser("gemini-mock", help="Serve a local stand-in for the Gemini API")
+    mock_parser.add_argument("--host", default="127.0.0.1")
+    mock_parser.add_argument("--port", type=int, default=8001)
+    mock_parser.add_argument("--latency-ms", type=int, default=800)
+    mock_parser.add_argument("--error-rate", type=float, default=0.0)
+    mock_parser.add_argument("--seed", type=int, default=0)
+    mock_parser.set_defaults(func=gemini_mock)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()